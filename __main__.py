@@ -3,5 +3,6 @@ import trio
 from . import mjollnir
 
 
-trio.run(mjollnir.main)
+if __name__ == '__main__':
+    trio.run(mjollnir.main)
 
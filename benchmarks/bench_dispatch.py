@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Task spawns of Plugins.dispatch over a connect, MOTD and NAMES sequence.
+
+    python -m Mjollnir.benchmarks.bench_dispatch
+
+Before the routing index, every message opened a nursery and started one
+task per loaded plugin. Here the same messages go through Plugins.dispatch
+and the nurseries and tasks it actually starts are counted.
+"""
+import logging
+
+import trio
+
+from ..core.irclib import parser
+from ..core.mixins import Network
+from ..plugins.dispatcher import Plugins
+
+MOTD_LINES = 60
+NAMES_LINES = 120
+
+
+class Driver:
+    overflow = "block"
+    queue_full = False
+
+    async def send(self, msg):
+        pass
+
+
+class Weather:
+    def __init__(self, network):
+        self.network = network
+
+    def weather(self, irc, msg, text):
+        irc.reply("sunny")
+
+
+class Greeter:
+    def __init__(self, network):
+        self.network = network
+
+    def _on_join(self, irc, msg, text):
+        pass
+
+
+class Seen:
+    def __init__(self, network):
+        self.network = network
+
+    def seen(self, irc, msg, text):
+        irc.reply("never")
+
+    def _on_part(self, irc, msg, text):
+        pass
+
+    def _on_quit(self, irc, msg, text):
+        pass
+
+
+PLUGINS = (Weather, Greeter, Seen)
+
+
+def connect_sequence():
+    lines = [
+        ":irc.example NOTICE * :*** Looking up your hostname...",
+        ":irc.example 001 mjollnir :Welcome to the Example IRC Network",
+        ":irc.example 002 mjollnir :Your host is irc.example",
+        ":irc.example 003 mjollnir :This server was created today",
+        ":irc.example 004 mjollnir irc.example ircd-1.0 iowx biklmnopstv",
+        ":irc.example 005 mjollnir CHANTYPES=# PREFIX=(ov)@+ NETWORK=Example :are supported",
+        ":irc.example 251 mjollnir :There are 5000 users on 3 servers",
+        ":irc.example 375 mjollnir :- irc.example Message of the Day -",
+    ]
+    lines += [f":irc.example 372 mjollnir :- Line {n} of the MOTD" for n in range(MOTD_LINES)]
+    lines += [
+        ":irc.example 376 mjollnir :End of /MOTD command.",
+        ":mjollnir MODE mjollnir :+iw",
+        ":mjollnir!mjollnir@bot.example JOIN #big",
+        ":irc.example 332 mjollnir #big :Topic",
+        ":irc.example 333 mjollnir #big someone 1600000000",
+    ]
+    names = " ".join(f"user{n}" for n in range(40))
+    lines += [f":irc.example 353 mjollnir = #big :{names}"] * NAMES_LINES
+    lines += [
+        ":irc.example 366 mjollnir #big :End of /NAMES list.",
+        "PING :irc.example",
+    ]
+    return [parser.parse(line) for line in lines]
+
+
+def main():
+    logging.disable(logging.WARNING)
+    network = Network({"network": "Example", "nick": "mjollnir", "ident": "mjollnir"},
+        Driver())
+    network.capabilities["CHANTYPES"] = "#"
+    plugins = Plugins(network)
+    for plugin in PLUGINS:
+        plugins.load(plugin)
+
+    counts = {"nurseries": 0, "tasks": 0}
+    invoke = plugins._invoke
+    dispatch = plugins._dispatch
+
+    async def counting_invoke(ctx, msg, tables, method):
+        counts["nurseries"] += 1
+        await invoke(ctx, msg, tables, method)
+
+    async def counting_dispatch(ctx, table, msg, method):
+        counts["tasks"] += 1
+        await dispatch(ctx, table, msg, method)
+
+    plugins._invoke = counting_invoke
+    plugins._dispatch = counting_dispatch
+
+    msgs = connect_sequence()
+
+    async def replay():
+        for msg in msgs:
+            await plugins.dispatch(msg)
+
+    try:
+        trio.run(replay)
+    finally:
+        plugins.close()
+
+    loaded = len(plugins.pluginlist)
+    print(f"{len(msgs)} messages, {loaded} plugins loaded")
+    print(f"nurseries {len(msgs):>5} -> {counts['nurseries']:>3}")
+    print(f"tasks     {len(msgs) * loaded:>5} -> {counts['tasks']:>3} "
+        f"({len(msgs) * loaded - counts['tasks']} saved)")
+
+
+if __name__ == "__main__":
+    main()
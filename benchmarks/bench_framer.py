@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Framing a 5000-user NAMES burst, against the original receive loop.
+
+    python -m Mjollnir.benchmarks.bench_framer
+
+old_frame below is the splitting Driver.receive did before LineFramer,
+without the socket, the decoding and the parsing.
+"""
+import logging
+import random
+import string
+import timeit
+
+from ..core.irclib.framer import LineFramer
+
+USERS = 5000
+# What Driver.receive asks the socket for
+READ_SIZE = 4096
+# A line that never ends, as a broken or hostile server would send it
+PARTIAL_SIZE = 240 * 1024
+ROUNDS = 5
+NUMBER = 20
+
+
+def old_frame(reads):
+    lines = []
+    s = bytearray()
+    for mesg in reads:
+        if s:
+            mesg = s + mesg
+            s = bytearray()
+
+        for m in mesg.split(b'\n'):
+            if m.endswith(b'\r'):
+                m = m.strip()
+                if m:
+                    lines.append(m)
+            else:
+                s += m
+
+    return lines
+
+
+def new_frame(reads):
+    framer = LineFramer()
+    lines = []
+    for data in reads:
+        lines.extend(framer.feed(data))
+
+    return lines
+
+
+def names_burst(rnd):
+    nicks = ["".join(rnd.choice(string.ascii_letters) for _ in range(rnd.randrange(4, 16)))
+        for _ in range(USERS)]
+    lines = []
+    line = []
+    for nick in nicks:
+        line.append(rnd.choice(("", "", "", "+", "@")) + nick)
+        if len(" ".join(line)) > 400:
+            lines.append(f":irc.example 353 mjollnir = #big :{' '.join(line)}\r\n")
+            line = []
+
+    if line:
+        lines.append(f":irc.example 353 mjollnir = #big :{' '.join(line)}\r\n")
+
+    lines.append(":irc.example 366 mjollnir #big :End of /NAMES list.\r\n")
+    return "".join(lines).encode()
+
+
+def reads_of(data):
+    return [data[pos:pos + READ_SIZE] for pos in range(0, len(data), READ_SIZE)]
+
+
+def best(f, reads):
+    return min(timeit.repeat(lambda: f(reads), number=NUMBER, repeat=ROUNDS)) / NUMBER
+
+
+def main():
+    # The partial line is dropped, warning about it every time
+    logging.disable(logging.WARNING)
+    rnd = random.Random(1459)
+    burst = reads_of(names_burst(rnd))
+    assert old_frame(burst) == new_frame(burst)
+    partial = reads_of(b"x" * PARTIAL_SIZE)
+    for name, reads in (("NAMES burst", burst), ("partial line", partial)):
+        before = best(old_frame, reads)
+        after = best(new_frame, reads)
+        print(f"{name:<13} {len(reads):>3} reads {before * 1000:7.3f} ms -> "
+            f"{after * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Memory and allocations per IRCMsg over a 100k-line log, against the original.
+
+    python -m Mjollnir.benchmarks.bench_ircmsg
+
+OldIRCMsg below is the dict-backed message before it was slotted, with the
+parts old_parse and copy() touch, and old_parse the parser that built it,
+both kept verbatim to measure against. Lines are decoded inside the traced
+region, as Driver.receive does, so a message keeping its raw line alive is
+charged for it.
+"""
+import gc
+import tracemalloc
+
+from ..core.enums import MsgType
+from ..core.irclib.parser import parse
+from .bench_parser import _old_decode_command, _old_split_hostmask
+
+LINES = 100000
+# Spooler._chunkify copies the message once per outgoing chunk
+COPIES = 10000
+
+LOG = [
+    ":nick{n}!ident@host{n}.example PRIVMSG #chan :hello there, how is it going? {n}",
+    ":nick{n}!ident@host{n}.example PRIVMSG #chan :)echo {{reverse abc}}",
+    ":irc.example 353 mjollnir = #chan :@op +voice user{n} user2 user3 user4 user5",
+    ":nick{n}!ident@host{n}.example JOIN #chan",
+    "PING :irc{n}.example",
+    ":irc.example 372 mjollnir :- Line {n} of the message of the day",
+]
+
+
+class OldIRCMsg:
+    def __init__(self, nick=None, ident=None, hostname=None, recipient=None,
+        type=None, ctcp=None, command=None, args=None, text='', encoded=False):
+        self.nick = nick
+        self.ident = ident
+        self.hostname = hostname
+        self.recipient = recipient
+        self.type = type
+        self.ctcpname = ctcp
+        self.command = command
+        self.args = args or []
+        self._text = text
+        self.encoded = encoded
+
+    def copy(self):
+        return OldIRCMsg(self.nick, self.ident, self.hostname, self.recipient,
+            self.type, self.ctcpname, self.command, self.args.copy(),
+            self.text, self.encoded)
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self.args[-1] = text
+        self._text = text
+
+
+def old_parse(line):
+    ircmsg = OldIRCMsg()
+    try:
+        first, rest = line.split(" ", 1)
+        if first.startswith(":"):
+            ircmsg.command, rest = rest.split(" ", 1)
+            ircmsg.nick, ircmsg.ident, ircmsg.hostname = _old_split_hostmask(first[1:])
+        else:
+            ircmsg.command = first
+
+        # Normalize to UPPERCASE
+        ircmsg.command = ircmsg.command.upper()
+
+        while not rest.startswith(":"):
+            try:
+                arg, rest = rest.split(" ", 1)
+            except ValueError:
+                ircmsg.args.append(rest)
+                break
+            else:
+                ircmsg.args.append(arg)
+        else:
+            ircmsg.args.append(rest[1:])
+
+        ircmsg.type = _old_decode_command(line, ircmsg)
+        if ircmsg.command in ("PRIVMSG", "NOTICE", "MODE") or ircmsg.command.isdigit():
+            ircmsg.recipient = ircmsg.args[0]
+    except ValueError:
+        ircmsg.text = line
+
+    return ircmsg
+
+
+def replayed_log():
+    return [LOG[n % len(LOG)].format(n=n).encode() for n in range(LINES)]
+
+
+def traced(f):
+    # Bytes and blocks still allocated once f returns, what it keeps alive
+    gc.collect()
+    tracemalloc.start()
+    kept = f()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = snapshot.statistics("filename")
+    size = sum(stat.size for stat in stats)
+    count = sum(stat.count for stat in stats)
+    del kept
+    return size, count
+
+
+def parse_all(parse, data):
+    return [parse(line.decode()) for line in data]
+
+
+def read_fields(msgs):
+    # What the handlers look at, materializing anything left lazy
+    for msg in msgs:
+        msg.nick, msg.args, msg.recipient
+
+    return msgs
+
+
+def copy_all(msgs):
+    return [msg.copy() for msg in msgs]
+
+
+def main():
+    data = replayed_log()
+    print(f"{LINES} lines")
+    for name, f in (("before", old_parse), ("after", parse)):
+        size, count = traced(lambda: parse_all(f, data))
+        print(f"{name:<6} parsed           {size / LINES:6.0f} bytes "
+            f"{count / LINES:5.1f} allocations per message")
+
+        msgs = parse_all(f, data)
+        size, count = traced(lambda: read_fields(parse_all(f, data)))
+        print(f"{name:<6} fields read      {size / LINES:6.0f} bytes "
+            f"{count / LINES:5.1f} allocations per message")
+
+        privmsgs = [msg for msg in msgs if msg.type is MsgType.REGULAR][:COPIES]
+        size, count = traced(lambda: copy_all(privmsgs))
+        print(f"{name:<6} copy()           {size / len(privmsgs):6.0f} bytes "
+            f"{count / len(privmsgs):5.1f} allocations per copy")
+        del msgs, privmsgs
+
+
+if __name__ == "__main__":
+    main()
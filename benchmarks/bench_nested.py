@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""NestedScanner on adversarial input, against the original scanner.
+
+    python -m Mjollnir.benchmarks.bench_nested
+
+OldScanner below is the scanner nested commands had before it went linear,
+kept verbatim to measure against. Limits are lifted on the new one so both
+scan the same text.
+"""
+import math
+import timeit
+
+from ..plugins.nested import NestedScanner
+
+SIZES = (25000, 100000, 400000)
+ROUNDS = 3
+
+INPUTS = {
+    # Every escape used to rebuild the whole string
+    "escapes": lambda n: "\\{" * (n // 2),
+    "backslashes": lambda n: "\\" * n,
+    "siblings": lambda n: "{a}" * (n // 3),
+    "deep": lambda n: "{" * (n // 2) + "}" * (n // 2),
+}
+
+
+class OldScanner:
+    def __init__(self, opening="{", closing="}", escapechar="\\"):
+        self.opening = opening
+        self.closing = closing
+        self.escapechar = escapechar
+
+    def scan(self, text):
+        self.reset()
+        self.string = text
+        self.total = len(text)
+        while self.current < self.total:
+            c = self.string[self.current]
+            if c == self.escapechar:
+                if self.peek() in (self.opening, self.closing, self.escapechar):
+                    self.string = self.string[:self.current] + self.string[self.current + 1:]
+                    self.total -= 1
+            elif c == self.opening:
+                self._found_opening()
+                self.start = self.current + 1
+            elif c == self.closing:
+                self._found_closing()
+                self.start = self.current + 1
+
+            self.current += 1
+
+        if self.depth > 0:
+            raise ValueError(f"Missing {self.depth} closing '{self.closing}'")
+        elif self.missing_opening:
+            raise ValueError(f"Missing {-self.missing_opening} opening '{self.opening}'")
+
+        if self.current_token:
+            self.tree.append(self.current_token)
+
+        return self.tree
+
+    def peek(self):
+        return self.string[self.current + 1] if self.current + 1 < self.total else ''
+
+    def reset(self):
+        self.tree = []
+        self.frame = self.tree
+        self.start = 0
+        self.current = 0
+        self.total = 0
+        self.missing_opening = 0
+        self.depth = 0
+
+    @property
+    def current_token(self):
+        return self.string[self.start:self.current]
+
+    def _found_opening(self):
+        token = self.current_token
+        if token:
+            self.frame.append(token)
+
+        if self.depth > 0:
+            self.tree.append(self.frame)
+
+        newf = []
+        self.frame.append(newf)
+        self.frame = newf
+        self.depth += 1
+
+    def _found_closing(self):
+        token = self.current_token
+        if token:
+            self.frame.append(token)
+
+        self.depth -= 1
+        if self.depth > 0:
+            self.frame = self.tree.pop()
+        elif self.depth == 0:
+            self.frame = self.tree
+        elif self.depth < self.missing_opening:
+            self.missing_opening = self.depth
+
+
+def best(f, text):
+    return min(timeit.repeat(lambda: f(text), number=1, repeat=ROUNDS))
+
+
+def main():
+    scanner = NestedScanner(maxlength=math.inf, maxdepth=math.inf)
+    for name, make in INPUTS.items():
+        for size in SIZES:
+            text = make(size)
+            before = best(OldScanner().scan, text)
+            after = best(scanner.scan, text)
+            print(f"{name:<12} {size:>7} chars {before * 1000:9.1f} ms -> "
+                f"{after * 1000:7.1f} ms")
+
+    # With the default limits, oversized input is turned down before scanning
+    scanner = NestedScanner()
+    for name, make in INPUTS.items():
+        after = best(lambda text: _rejected(scanner, text), make(SIZES[-1]))
+        print(f"{name:<12} rejected in {after * 1e6:.1f} us")
+
+
+def _rejected(scanner, text):
+    try:
+        scanner.scan(text)
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Memory of a synthetic 100k-membership network, against the original store.
+
+    python -m Mjollnir.benchmarks.bench_network
+
+OldChannel and OldNick below are the records the store had before they were
+slotted and shared, kept verbatim to measure against: one Nick per
+membership, a grade set each and a topic dict per channel.
+"""
+import time
+import tracemalloc
+
+from ..core.mixins import Network
+
+USERS = 10000
+CHANNELS_PER_USER = 10
+CHANNELS = 100
+IDENTS = 7
+HOSTS = 50
+OPS = 1000
+
+
+class OldChannel:
+    def __init__(self, channelname):
+        self.name = channelname
+        self.topic = dict(
+            text='',
+            setby='',
+            timestamp=''
+        )
+        self.modes = {}
+        self.nicks = {}
+        self.bans = {}
+        self.excepts = {}
+
+    def __iter__(self):
+        for nick in self.nicks:
+            yield nick
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return self.name.lower() == other.lower()
+        elif isinstance(other, OldChannel):
+            return self.name.lower() == other.name.lower()
+        else:
+            return False
+
+    def __str__(self):
+        return self.name
+
+
+class OldNick:
+    def __init__(self, name):
+        self.name = name
+        self.ident = None
+        self.hostname = None
+        self.grade = set()
+
+    def rename(self, newnick):
+        self.name = newnick
+
+
+def joins():
+    # Strings are built per JOIN, the way parsing every line would
+    for user in range(USERS):
+        for idx in range(CHANNELS_PER_USER):
+            channel = f"#chan{(user + idx * 7) % CHANNELS}"
+            yield channel, f"user{user}", f"ident{user % IDENTS}", f"host{user % HOSTS}.example"
+
+
+def ops():
+    for user in range(OPS):
+        yield f"#chan{user % CHANNELS}", f"user{user}"
+
+
+def old_store():
+    channels = {}
+    for n in range(CHANNELS):
+        name = f"#chan{n}"
+        channels[name.lower()] = OldChannel(name)
+
+    for channel, name, ident, hostname in joins():
+        nick = OldNick(name)
+        # The old JOIN handler didn't keep these, stored here to compare
+        # like with like
+        nick.ident = ident
+        nick.hostname = hostname
+        channels[channel.lower()].nicks[name] = nick
+
+    for channel, name in ops():
+        channels[channel].nicks[name].grade.add("o")
+
+    return channels
+
+
+def new_store():
+    network = Network({"network": "Test", "nick": "mjollnir"}, None)
+    for n in range(CHANNELS):
+        network.add_channel(f"#chan{n}")
+
+    for channel, name, ident, hostname in joins():
+        network.add_member(channel, name, ident, hostname)
+
+    op = network.prefix_bits["o"]
+    for channel, name in ops():
+        network.channels[channel].set_grade(name, op)
+
+    return network
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return size, elapsed
+
+
+def main():
+    print(f"{USERS} users in {CHANNELS_PER_USER} of {CHANNELS} channels "
+        f"({USERS * CHANNELS_PER_USER} memberships), {OPS} ops")
+    for name, build in (("before", old_store), ("after", new_store)):
+        size, elapsed = measure(build)
+        print(f"{name:<6} {size / 2 ** 20:6.1f} MiB {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
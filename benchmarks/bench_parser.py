@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Lines per second of parser.parse, against the original parser.
+
+    python -m Mjollnir.benchmarks.bench_parser
+
+old_parse below is the parser before it went index-based, kept verbatim to
+measure against, with OldMsg standing in for the parts of the old IRCMsg
+it touches. The old parser splits everything up front and parse() only
+when a field is read, so both are timed with and without reading them.
+"""
+import math
+import re
+import timeit
+
+from ..core.enums import MsgType
+from ..core.irclib.parser import parse
+
+ROUNDS = 30
+NUMBER = 5
+
+# Untagged, the old parser doesn't know about tags
+LINES = [
+    ":nick!ident@host.example PRIVMSG #chan :hello there, how is it going?",
+    ":nick!ident@host.example PRIVMSG #chan :)echo {reverse abc}",
+    ":nick!ident@host.example PRIVMSG mjollnir :\x01VERSION\x01",
+    ":nick!ident@host.example PRIVMSG #chan :\x01ACTION waves\x01",
+    ":nick!ident@host.example NOTICE mjollnir :a notice",
+    ":irc.example 353 mjollnir = #chan :@op +voice user1 user2 user3 user4",
+    ":irc.example 372 mjollnir :- Message of the day",
+    ":irc.example 005 mjollnir CHANTYPES=# PREFIX=(ov)@+ NETWORK=Example :are supported",
+    ":nick!ident@host.example JOIN #chan",
+    ":nick!ident@host.example MODE #chan +ov nick other",
+    ":nick!ident@host.example QUIT :Quit: bye",
+    "PING :irc.example",
+]
+TAGGED = [
+    "@time=2024-01-01T00:00:00.000Z;account=nick " + LINES[0],
+    "@msgid=abc\\sdef;+draft/reply=xyz " + LINES[1],
+]
+
+
+class OldMsg:
+    def __init__(self):
+        self.nick = None
+        self.ident = None
+        self.hostname = None
+        self.recipient = None
+        self.type = None
+        self.ctcpname = None
+        self.command = None
+        self.args = []
+        self._text = ''
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self.args[-1] = text
+        self._text = text
+
+
+sender_re = re.compile(r'^(\S+)!(\S+)@(\S+)$')
+ctcp_re = re.compile(
+    r"^\x01"
+    r"([^ \x00\x01\n\r]+) ?"
+    r"([^\x00\x01\n\r]+)?"
+    r"\x01$")
+
+def _old_split_hostmask(sender):
+    nick, ident, hostname = (None, None, None)
+    try:
+        m = sender_re.match(sender)
+        if m:
+            nick, ident, hostname = m.groups()
+        else:
+            raise ValueError
+    except ValueError:
+        nick = sender
+    except TypeError:
+        pass
+
+    return nick, ident, hostname
+
+
+def _old_decode_command(line, ircmsg):
+    cmd, text = (ircmsg.command, ircmsg.args[-1])
+
+    if not line.startswith(":"):
+        cmdtype = MsgType.SERVERCMD
+    elif cmd.isdigit():
+        cmdtype = MsgType.NUMERIC
+    elif cmd == "NOTICE":
+        m = ctcp_re.match(text)
+        if m:
+            cmdtype = MsgType.CTCPREPLY
+            # Normalize to UPPERCASE
+            ircmsg.ctcpname = m.group(1).upper()
+            ircmsg.text = m.group(2) or ''
+        else:
+            cmdtype = MsgType.NOTICE
+            ircmsg.text = text
+    elif cmd == "PRIVMSG":
+        m = ctcp_re.match(text)
+        if m:
+            # Normalize to UPPERCASE
+            ctcpname = m.group(1).upper()
+            if ctcpname == "ACTION":
+                cmdtype = MsgType.ACTION
+            else:
+                cmdtype = MsgType.CTCP
+                ircmsg.ctcpname = ctcpname
+
+            ircmsg.text = m.group(2) or ''
+        else:
+            cmdtype = MsgType.REGULAR
+            ircmsg.text = text
+    else:
+        cmdtype = MsgType.CLIENTCMD
+
+    return cmdtype
+
+
+def old_parse(line):
+    ircmsg = OldMsg()
+    try:
+        first, rest = line.split(" ", 1)
+        if first.startswith(":"):
+            ircmsg.command, rest = rest.split(" ", 1)
+            ircmsg.nick, ircmsg.ident, ircmsg.hostname = _old_split_hostmask(first[1:])
+        else:
+            ircmsg.command = first
+
+        # Normalize to UPPERCASE
+        ircmsg.command = ircmsg.command.upper()
+
+        while not rest.startswith(":"):
+            try:
+                arg, rest = rest.split(" ", 1)
+            except ValueError:
+                ircmsg.args.append(rest)
+                break
+            else:
+                ircmsg.args.append(arg)
+        else:
+            ircmsg.args.append(rest[1:])
+
+        ircmsg.type = _old_decode_command(line, ircmsg)
+        if ircmsg.command in ("PRIVMSG", "NOTICE", "MODE") or ircmsg.command.isdigit():
+            ircmsg.recipient = ircmsg.args[0]
+    except ValueError:
+        ircmsg.text = line
+
+    return ircmsg
+
+
+def rates(parsers, lines, run):
+    # Rounds alternate between the parsers, so they see the same noise
+    best = [math.inf] * len(parsers)
+    for _ in range(ROUNDS):
+        for idx, f in enumerate(parsers):
+            best[idx] = min(best[idx], timeit.timeit(lambda: run(f, lines),
+                number=NUMBER))
+
+    return [len(lines) * NUMBER / elapsed for elapsed in best]
+
+
+def parse_only(f, lines):
+    for line in lines:
+        f(line)
+
+
+def parse_and_read(f, lines):
+    # What the bookkeeping and the dispatcher read, the lazy parser splits
+    # the arguments and the hostmask only here
+    for line in lines:
+        msg = f(line)
+        msg.nick, msg.ident, msg.hostname, msg.args, msg.recipient
+
+
+def main():
+    for name, run in (("parse only", parse_only), ("parse + fields", parse_and_read)):
+        before, after = rates((old_parse, parse), LINES * 50, run)
+        print(f"untagged {name:<14} {before / 1000:6.0f}k -> {after / 1000:6.0f}k "
+            f"lines/s ({after / before:.2f}x)")
+
+    for name, run in (("parse only", parse_only), ("parse + fields", parse_and_read)):
+        tagged, = rates((parse,), TAGGED * 300, run)
+        print(f"tagged   {name:<14}            {tagged / 1000:6.0f}k lines/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""Channel and nick store with 50k-user channels, against the original one.
+
+    python -m Mjollnir.benchmarks.bench_store
+
+OldChannel, OldNick, OldContext and the old_* handlers below are the store
+and the bookkeeping before the casemapped index, kept verbatim to measure
+against. The handlers never suspend, so both sets are stepped once without
+an event loop.
+"""
+import time
+
+from ..core.bookkeeping import clientcmds, numerics
+from ..core.irclib import parser
+from ..core.irclib.context import IRCContext
+from ..core.mixins import Network
+
+USERS = 50000
+CHANNELS = 3
+NAMES_PER_LINE = 40
+OPS = 200
+ROUNDS = 5
+
+MAP_RFC1459 = str.maketrans("{|}~", r"[\]^")
+MAP_STRICT_RFC1459 = str.maketrans("{|}", r"[\]")
+
+
+class OldChannel:
+    def __init__(self, channelname):
+        self.name = channelname
+        self.topic = dict(
+            text='',
+            setby='',
+            timestamp=''
+        )
+        self.modes = {}
+        self.nicks = {}
+        self.bans = {}
+        self.excepts = {}
+
+    def __iter__(self):
+        for nick in self.nicks:
+            yield nick
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return self.name.lower() == other.lower()
+        elif isinstance(other, OldChannel):
+            return self.name.lower() == other.name.lower()
+        else:
+            return False
+
+    def __str__(self):
+        return self.name
+
+
+class OldNick:
+    def __init__(self, name):
+        self.name = name
+        self.ident = None
+        self.hostname = None
+        self.grade = set()
+
+    def rename(self, newnick):
+        self.name = newnick
+
+
+class OldNetwork:
+    def __init__(self):
+        self.identity = {"nick": "mjollnir"}
+        self.capabilities = {"CASEMAPPING": "rfc1459"}
+        self.prefix_modes = "ov"
+        self.prefix_literals = "@+"
+        self.channels = {}
+
+
+class OldContext:
+    def __init__(self, network):
+        self.network = network
+
+    def nick_tolower(self, nick):
+        casing = self.network.capabilities["CASEMAPPING"]
+
+        if casing == "rfc1459":
+            return nick.translate(MAP_RFC1459).lower()
+        elif casing == "strict-rfc1459":
+            return nick.translate(MAP_STRICT_RFC1459).lower()
+        elif casing == "ascii":
+            return nick.lower()
+        else:
+            raise ValueError(f"Invalid CASEMAPPING '{casing}'")
+
+    def nick_isin(self, nick, channel):
+        for other in channel:
+            if self.nick_cmp(nick, other):
+                return True
+
+        return False
+
+    def nick_cmp(self, a, b):
+        if isinstance(a, OldNick):
+            a = a.name
+        elif not isinstance(a, str):
+            return False
+
+        if isinstance(b, OldNick):
+            b = b.name
+        elif not isinstance(b, str):
+            return False
+
+        return self.nick_tolower(a) == self.nick_tolower(b)
+
+
+async def old_join(network, msg):
+    channel = msg.args[0].lower()
+    network.channels[channel].nicks[msg.nick] = OldNick(msg.nick)
+
+
+async def old_part(network, msg):
+    channel = msg.args[0].lower()
+    if msg.nick == network.identity["nick"]:
+        network.channels.pop(channel)
+    else:
+        network.channels[channel].nicks.pop(msg.nick)
+
+
+async def old_quit(network, msg):
+    for channel in network.channels.values():
+        if msg.nick in channel:
+            channel.nicks.pop(msg.nick)
+
+
+async def old_nick(network, msg):
+    newnick = msg.args[0]
+    for channel in network.channels.values():
+        nick = channel.nicks.get(msg.nick)
+        if nick is not None:
+            if msg.nick == network.identity["nick"]:
+                network.identity["nick"] = newnick
+
+            channel.nicks.pop(msg.nick)
+            nick.rename(newnick)
+            channel.nicks[newnick] = nick
+
+
+async def old_numeric_353(network, msg):
+    channel, nicks = msg.args[-2:]
+    channel = channel.lower()
+    for nk in nicks.split(" "):
+        grade = set()
+        for idx, c in enumerate(nk):
+            try:
+                modeidx = network.prefix_literals.index(c)
+            except ValueError:
+                nk = nk[idx:]
+                break
+            else:
+                grade.add(network.prefix_modes[modeidx])
+
+        nick = OldNick(nk)
+        nick.grade.update(grade)
+        network.channels[channel].nicks[nk] = nick
+
+
+async def old_numeric_366(network, msg):
+    # The old store had no handler for RPL_ENDOFNAMES
+    pass
+
+
+def step(coro):
+    try:
+        coro.send(None)
+    except StopIteration:
+        pass
+    else:
+        raise RuntimeError("a handler suspended")
+
+
+def names_burst():
+    # Same members in every channel, one in twenty opped, one in ten voiced
+    names = []
+    for user in range(USERS):
+        prefix = "@" if user % 20 == 0 else "+" if user % 10 == 0 else ""
+        names.append(f"{prefix}User{user}")
+
+    msgs = []
+    for idx in range(CHANNELS):
+        channel = f"#big{idx}"
+        for pos in range(0, USERS, NAMES_PER_LINE):
+            line = " ".join(names[pos:pos + NAMES_PER_LINE])
+            msgs.append(parser.parse(f":irc.example 353 mjollnir = {channel} :{line}"))
+
+        msgs.append(parser.parse(f":irc.example 366 mjollnir {channel} :End of /NAMES list."))
+
+    return msgs
+
+
+def victims():
+    # Spread over the channels' insertion order, so a scan is half a channel
+    return [f"User{user}" for user in range(USERS // OPS // 2, USERS, USERS // OPS)]
+
+
+def parsed(lines):
+    return [parser.parse(line) for line in lines]
+
+
+def quits():
+    return parsed(f":{nick}!ident@host.example QUIT :bye" for nick in victims())
+
+
+def nicks():
+    return parsed(f":{nick}!ident@host.example NICK {nick}_away" for nick in victims())
+
+
+def partjoins():
+    lines = []
+    for nick in victims():
+        lines.append(f":{nick}!ident@host.example PART #big0")
+        lines.append(f":{nick}!ident@host.example JOIN #big0")
+
+    return parsed(lines)
+
+
+class Old:
+    handlers = {"353": old_numeric_353, "366": old_numeric_366, "QUIT": old_quit,
+        "NICK": old_nick, "PART": old_part, "JOIN": old_join}
+
+    def __init__(self):
+        self.network = OldNetwork()
+        self.ctx = OldContext(self.network)
+        for idx in range(CHANNELS):
+            name = f"#big{idx}"
+            self.network.channels[name] = OldChannel(name)
+
+    def dispatch(self, msgs):
+        for msg in msgs:
+            step(self.handlers[msg.command](self.network, msg))
+
+    def isin(self, names):
+        channel = self.network.channels["#big0"]
+        return [self.ctx.nick_isin(name, channel) for name in names]
+
+
+class New:
+    handlers = {"353": numerics.numeric_353, "366": numerics.numeric_366,
+        "QUIT": clientcmds.quit, "NICK": clientcmds.nick, "PART": clientcmds.part,
+        "JOIN": clientcmds.join}
+
+    def __init__(self):
+        self.network = Network({"network": "Example", "nick": "mjollnir"}, None)
+        self.ctx = IRCContext(self.network)
+        for idx in range(CHANNELS):
+            self.network.add_channel(f"#big{idx}")
+
+    def dispatch(self, msgs):
+        for msg in msgs:
+            step(self.handlers[msg.command](self.network, msg))
+
+    def isin(self, names):
+        channel = self.network.channels["#big0"]
+        return [self.ctx.nick_isin(name, channel) for name in names]
+
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+
+def best(store, burst, work):
+    # Fresh, loaded store for every round, only work(store) is timed
+    times = []
+    for _ in range(ROUNDS):
+        s = store()
+        s.dispatch(burst)
+        times.append(timed(lambda: work(s)))
+        # The old linear scans take seconds, one round of those will do
+        if times[-1] > 1:
+            break
+
+    return min(times)
+
+
+def main():
+    burst = names_burst()
+    # Stored in the case NAMES gave, looked up in another one
+    lookups = [name.lower() for name in victims()]
+    quits_, nicks_, partjoins_ = quits(), nicks(), partjoins()
+    cases = (
+        ("NAMES commit", None),
+        (f"{OPS} nick_isin", lambda s: s.isin(lookups)),
+        (f"{OPS} QUIT", lambda s: s.dispatch(quits_)),
+        (f"{OPS} NICK", lambda s: s.dispatch(nicks_)),
+        (f"{OPS} PART+JOIN", lambda s: s.dispatch(partjoins_)),
+    )
+
+    new = New()
+    new.dispatch(burst)
+    assert new.isin(lookups) == [True] * len(lookups)
+    assert sum(len(ch.nicks) for ch in new.network.channels.values()) == USERS * CHANNELS
+
+    print(f"{CHANNELS} channels of {USERS} users ({USERS * CHANNELS} memberships)")
+    for name, work in cases:
+        if work is None:
+            before = min(timed(lambda: Old().dispatch(burst)) for _ in range(ROUNDS))
+            after = min(timed(lambda: New().dispatch(burst)) for _ in range(ROUNDS))
+        else:
+            before = best(Old, burst, work)
+            after = best(New, burst, work)
+
+        print(f"{name:<14} {before * 1000:9.2f} ms -> {after * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,43 @@
 from ..enums import MsgType
 from ..irclib import commands
 from .. import utils
-from . import numerics, clientcmds
+from . import numerics, clientcmds, whosync
+
+CLIENTCMDS = clientcmds.HANDLERS.handlers
+NUMERICS = numerics.HANDLERS.handlers
+# Everything else can be kept away from the bookkeeper
+COMMANDS = (frozenset({"PING"}) | clientcmds.HANDLERS.commands
+    | numerics.HANDLERS.commands | whosync.NUMERICS)
 
 
 class Bookkeeper:
+    commands = COMMANDS
+
     def __init__(self, network):
         self.network = network
+        identity = network.identity
+        self.whosync = whosync.WhoSync(network,
+            interval=identity.get("who_interval", whosync.WHO_INTERVAL),
+            refresh=identity.get("who_refresh", whosync.REFRESH_INTERVAL))
 
     async def _manage_servercmd(self, msg):
         if msg.command == "PING":
             await utils.send(self.network, commands.pong(*msg.args))
 
     async def _manage_clientcmd(self, msg):
-        if msg.command == "MODE":
-            if msg.recipient == self.network.identity["nick"]:
-                await clientcmds.umode(self.network, msg.args[-1])
-            else:
-                await clientcmds.cmode(self.network, msg.sender, msg.args)
-        else:
-            f = getattr(clientcmds, msg.command.lower(), None)
-            if f:
-                await f(self.network, msg)
+        f = CLIENTCMDS.get(msg.command)
+        if f:
+            await f(self.network, msg)
+
+        if msg.command == "JOIN" and msg.nick == self.network.identity["nick"]:
+            self.whosync.schedule(msg.args[0])
 
     async def _manage_numeric(self, msg):
-        f = getattr(numerics, f"numeric_{msg.command}", None)
+        if msg.command in whosync.NUMERICS:
+            self.whosync.manage(msg)
+            return
+
+        f = NUMERICS.get(msg.command)
         if f:
             await f(self.network, msg)
 
@@ -35,3 +48,7 @@ class Bookkeeper:
             await self._manage_clientcmd(msg)
         elif msg.type is MsgType.NUMERIC:
             await self._manage_numeric(msg)
+
+    async def manage_batch(self, msgs):
+        for msg in msgs:
+            await self.manage(msg)
@@ -1,10 +1,19 @@
 import logging
 
 from ..irclib import commands
-from ..mixins import Channel, Nick
 from .. import utils
+from .registry import Registry
 
 log = logging.getLogger("mjollnir")
+HANDLERS = Registry()
+
+
+@HANDLERS.register("MODE")
+async def mode(network, msg):
+    if msg.recipient == network.identity["nick"]:
+        await umode(network, msg.args[-1])
+    else:
+        await cmode(network, msg.sender, msg.args)
 
 
 async def umode(network, modes):
@@ -16,7 +25,7 @@ async def umode(network, modes):
 
 
 async def cmode(network, sender, args):
-    ch = network.channels[args[0].lower()]
+    ch = network.channels[args[0]]
 
     if len(args) > 2:
         modes, targets = args[1], args[2:]
@@ -43,13 +52,7 @@ async def cmode(network, sender, args):
                 except KeyError:
                     pass
         elif mode in network.prefix_modes:
-            if sign == "+":
-                ch.nicks[target].grade.add(mode)
-            else:
-                try:
-                    ch.nicks[target].grade.remove(mode)
-                except KeyError:
-                    pass
+            ch.set_grade(target, network.prefix_bits[mode], sign == "+")
         else:
             if sign == "+":
                 ch.modes[mode] = target
@@ -60,51 +63,49 @@ async def cmode(network, sender, args):
                     pass
 
 
+@HANDLERS.register("JOIN")
 async def join(network, msg):
-    channel = msg.args[0].lower()
+    channel = msg.args[0]
     if msg.nick == network.identity["nick"]:
-        network.channels[channel] = Channel(channel)
-        await utils.send(network, commands.mode(channel))
-        await utils.send(network, commands.mode(channel, "+b"))
+        network.add_channel(channel)
+        utils.send_nowait(network, commands.mode(channel))
+        utils.send_nowait(network, commands.mode(channel, "+b"))
     else:
-        network.channels[channel].nicks[msg.nick] = Nick(msg.nick)
+        network.add_member(channel, msg.nick, msg.ident, msg.hostname)
 
 
+@HANDLERS.register("PART")
 async def part(network, msg):
-    channel = msg.args[0].lower()
+    channel = msg.args[0]
     if msg.nick == network.identity["nick"]:
-        network.channels.pop(channel)
+        network.remove_channel(channel)
     else:
-        network.channels[channel].nicks.pop(msg.nick)
+        network.remove_member(channel, msg.nick)
 
 
+@HANDLERS.register("QUIT")
 async def quit(network, msg):
-    for channel in network.channels.values():
-        if msg.nick in channel:
-            channel.nicks.pop(msg.nick)
+    network.remove_user(msg.nick)
 
 
+@HANDLERS.register("NICK")
 async def nick(network, msg):
     newnick = msg.args[0]
-    for channel in network.channels.values():
-        nick = channel.nicks.get(msg.nick)
-        if nick is not None:
-            if msg.nick == network.identity["nick"]:
-                network.identity["nick"] = newnick
+    if msg.nick == network.identity["nick"]:
+        network.identity["nick"] = newnick
 
-            channel.nicks.pop(msg.nick)
-            nick.rename(newnick)
-            channel.nicks[newnick] = nick
+    network.rename_user(msg.nick, newnick)
 
 
+@HANDLERS.register("TOPIC")
 async def topic(network, msg):
-    channel = msg.args[0].lower()
+    channel = msg.args[0]
     try:
         topictext = msg.args[1]
     except IndexError:
         topictext = ''
 
     topic = network.channels[channel].topic
-    topic["text"] = topictext
-    topic["setby"] = msg.nick
-    topic["timestamp"] = utils.timestamp_now()
+    topic.text = topictext
+    topic.setby = msg.nick
+    topic.timestamp = utils.timestamp_now()
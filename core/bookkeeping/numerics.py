@@ -1,12 +1,14 @@
 import logging
 
 from ..irclib import commands
-from ..mixins import Nick
+from ..mixins import DEFAULT_CASEMAPPING, DEFAULT_PREFIX
 from .. import utils
 from . import clientcmds
+from .registry import Registry
 
 
 log = logging.getLogger("mjollnir")
+HANDLERS = Registry()
 
 
 def isupport_chanmodes(network, v, remove):
@@ -23,10 +25,15 @@ def isupport_chanmodes(network, v, remove):
 
 
 def isupport_prefix(network, v, remove):
-    modes, literals = v.split(")", 1)
-    modes = modes[1:]
-    network.prefix_modes = modes
-    network.prefix_literals = literals
+    network.set_prefix(v if v is not None and not remove else DEFAULT_PREFIX)
+
+
+def isupport_casemapping(network, v, remove):
+    try:
+        network.set_casemapping(v if v and not remove else DEFAULT_CASEMAPPING)
+    except ValueError:
+        log.warning(f"!!! Network {network.name} has unknown CASEMAPPING {v}, using {DEFAULT_CASEMAPPING}")
+        network.set_casemapping(DEFAULT_CASEMAPPING)
 
 
 def isupport_excepts(network, v, remove):
@@ -50,6 +57,7 @@ def isupport_targmax(network, v, remove):
 ISUPPORT = {
     "CHANMODES": isupport_chanmodes,
     "PREFIX": isupport_prefix,
+    "CASEMAPPING": isupport_casemapping,
     "EXCEPTS": isupport_excepts,
     "MODES": isupport_modes,
     "TARGMAX": isupport_targmax,
@@ -57,16 +65,18 @@ ISUPPORT = {
 
 
 # RPL_WELCOME
+@HANDLERS.register("001")
 async def numeric_001(network, msg):
     network.identified = True
     me = network.identity["nick"]
     modes = network.identity.get("modes")
     if modes:
-        await utils.send(network, commands.mode(me, modes))
-        await utils.send(network, commands.whois(me))
+        utils.send_nowait(network, commands.mode(me, modes))
+        utils.send_nowait(network, commands.whois(me))
 
 
 # RPL_ISUPPORT
+@HANDLERS.register("005")
 async def numeric_005(network, msg):
     for arg in msg.args[1:-1]:
         k, v = "", None
@@ -90,55 +100,75 @@ async def numeric_005(network, msg):
 
 
 # RPL_WHOISUSER
+@HANDLERS.register("311")
 async def numeric_311(network, msg):
     network.identity["ident"] = msg.args[2]
     network.hostname = msg.args[3]
 
 
 # RPL_CHANNELMODEIS
+@HANDLERS.register("324")
 async def numeric_324(network, msg):
     await clientcmds.cmode(network, msg.sender, msg.args[1:])
 
 
 # RPL_TOPIC
+@HANDLERS.register("332")
 async def numeric_332(network, msg):
     channel, topictext = msg.args[-2:]
-    channel = channel.lower()
-    network.channels[channel].topic["text"] = topictext
+    network.channels[channel].topic.text = topictext
 
 
 # RPL_TOPICWHOTIME
+@HANDLERS.register("333")
 async def numeric_333(network, msg):
     channel, setby, timestamp = msg.args[-3:]
-    channel = channel.lower()
     topic = network.channels[channel].topic
-    topic["setby"] = setby
-    topic["timestamp"] = timestamp
+    topic.setby = setby
+    topic.timestamp = timestamp
 
 
-# RPL_WHOREPLY
+# RPL_NAMREPLY
+@HANDLERS.register("353")
 async def numeric_353(network, msg):
     channel, nicks = msg.args[-2:]
-    channel = channel.lower()
-    for nk in nicks.split(" "):
-        grade = set()
-        for idx, c in enumerate(nk):
-            try:
-                modeidx = network.prefix_literals.index(c)
-            except ValueError:
-                nk = nk[idx:]
-                break
-            else:
-                grade.add(network.prefix_modes[modeidx])
-
-        nick = Nick(nk)
-        nick.grade.update(grade)
-        network.channels[channel].nicks[nk] = nick
+    ch = network.channels.get(channel)
+    if ch is None:
+        return
+
+    literals = network.prefix_literals
+    prefix_map = network.prefix_map
+    names = ch.names
+    for nk in nicks.split():
+        # Every prefix is there with multi-prefix, only the highest otherwise
+        name = nk.lstrip(literals)
+        grade = 0
+        for c in nk[:len(nk) - len(name)]:
+            grade |= prefix_map[c]
+
+        # nick!ident@host with userhost-in-names
+        ident = hostname = None
+        if "!" in name:
+            name, _, userhost = name.partition("!")
+            ident, _, hostname = userhost.partition("@")
+
+        names.append((name, ident, hostname, grade))
+
+
+# RPL_ENDOFNAMES
+@HANDLERS.register("366")
+async def numeric_366(network, msg):
+    ch = network.channels.get(msg.args[1])
+    # We'd be in the list ourselves, without any 353 there's nothing to go by
+    if ch is not None and ch.names:
+        network.commit_members(ch.name, ch.names)
+        ch.names = []
 
 
 # RPL_BANLIST
+@HANDLERS.register("367")
 async def numeric_367(network, msg):
-    channel = msg.args[-4].lower()
+    channel = msg.args[-4]
     target, setby, timestamp = msg.args[-3:]
     network.channels[channel].bans[target] = (setby, timestamp)
 
@@ -158,27 +188,30 @@ async def _autojoin(network, msg):
             nopw.append(channel)
 
     if nopw:
-        await utils.send(network, commands.joins(nopw))
+        utils.send_nowait(network, commands.joins(nopw))
 
     if withpw:
-        await utils.send(network, commands.joins(withpw, passwd))
+        utils.send_nowait(network, commands.joins(withpw, passwd))
 
 
 # RPL_ENDOFMOTD
+@HANDLERS.register("376")
 async def numeric_376(network, msg):
     await _autojoin(network, msg)
 
 
 # RPL_NOMOTD
+@HANDLERS.register("422")
 async def numeric_422(network, msg):
     await _autojoin(network, msg)
 
 
 # ERR_NICKNAMEINUSE
+@HANDLERS.register("433")
 async def numeric_433(network, msg):
     if not network.identified:
         nick = network.identity["nick"]
         newnick = next(network.nickgen)
         network.identity["nick"] = newnick
         log.info(f"@{network.name} Nickname {nick} is taken, trying {newnick}")
-        await utils.send(network, commands.nick(newnick))
+        utils.send_nowait(network, commands.nick(newnick))
@@ -0,0 +1,24 @@
+from types import MappingProxyType
+
+
+class Registry:
+    def __init__(self):
+        self._handlers = {}
+        # Read-only, handlers only get in through register()
+        self.handlers = MappingProxyType(self._handlers)
+
+    def register(self, *commands):
+        def decorator(f):
+            for command in commands:
+                if command in self._handlers:
+                    raise ValueError(f"{command} is already handled by {self._handlers[command].__name__}")
+
+                self._handlers[command] = f
+
+            return f
+
+        return decorator
+
+    @property
+    def commands(self):
+        return frozenset(self._handlers)
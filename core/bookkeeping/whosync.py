@@ -0,0 +1,131 @@
+import logging
+from collections import deque
+
+import trio
+
+from ..irclib import commands
+from .. import utils
+
+# Seconds between two WHO queries
+WHO_INTERVAL = 5
+# Seconds to wait for RPL_ENDOFWHO before moving on
+WHO_TIMEOUT = 60
+# Seconds between looking for members with an unknown hostmask
+REFRESH_INTERVAL = 600
+# Line tokens that must be left in the flood bucket before querying
+HEADROOM = 5
+# Token, channel, ident, host, nick, flags
+WHOX_FIELDS = "%tcuhnf"
+WHOX_TOKEN = "174"
+# RPL_WHOREPLY, RPL_WHOSPCRPL, RPL_ENDOFWHO
+NUMERICS = frozenset({"352", "354", "315"})
+
+log = logging.getLogger("mjollnir")
+
+
+class WhoSync:
+    def __init__(self, network, *, interval=WHO_INTERVAL, refresh=REFRESH_INTERVAL):
+        self.network = network
+        self.interval = interval
+        self.refresh = refresh
+        self.pending = deque()
+        self._queued = set()
+        self._lot = trio.lowlevel.ParkingLot()
+        # Folded mask of the query waiting for RPL_ENDOFWHO
+        self._current = None
+        self._done = None
+
+    def schedule(self, channel):
+        key = self.network.casemapping.fold(channel)
+        if key not in self._queued:
+            self._queued.add(key)
+            self.pending.append(channel)
+            self._lot.unpark_all()
+
+    async def run(self):
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(self._refresh)
+            while True:
+                while not self.pending:
+                    await self._lot.park()
+
+                channel = self.pending.popleft()
+                self._queued.discard(self.network.casemapping.fold(channel))
+                if channel not in self.network.channels:
+                    continue
+
+                await self._wait_idle()
+                await self._query(channel)
+                await trio.sleep(self.interval)
+
+    async def _wait_idle(self):
+        # Only spend what the rest of the bot leaves unused
+        network = self.network
+        while not (network.identified and network._driver.idle(HEADROOM)):
+            await trio.sleep(1)
+
+    async def _query(self, channel):
+        network = self.network
+        self._current = network.casemapping.fold(channel)
+        self._done = trio.Event()
+        if "WHOX" in network.capabilities:
+            msg = commands.who(channel, f"{WHOX_FIELDS},{WHOX_TOKEN}")
+        else:
+            msg = commands.who(channel)
+
+        log.debug(f"@{network.name} whosync Syncing {channel}")
+        await utils.send(network, msg)
+        with trio.move_on_after(WHO_TIMEOUT):
+            await self._done.wait()
+
+        if not self._done.is_set():
+            log.info(f"@{network.name} whosync No RPL_ENDOFWHO for {channel}")
+
+        self._current = None
+
+    async def _refresh(self):
+        while True:
+            await trio.sleep(self.refresh)
+            for channel in self.network.channels.values():
+                if any(nick.ident is None for nick in channel.nicks.values()):
+                    self.schedule(channel.name)
+
+    def manage(self, msg):
+        if msg.command == "352":
+            # RPL_WHOREPLY
+            channel, ident, hostname, _, name, flags = msg.args[1:7]
+            self._update(channel, name, ident, hostname, flags)
+        elif msg.command == "354":
+            # RPL_WHOSPCRPL, only the fields asked for in WHOX_FIELDS
+            if len(msg.args) == 7 and msg.args[1] == WHOX_TOKEN:
+                channel, ident, hostname, name, flags = msg.args[2:]
+                self._update(channel, name, ident, hostname, flags)
+        elif msg.command == "315":
+            # RPL_ENDOFWHO
+            if self._current == self.network.casemapping.fold(msg.args[1]):
+                self._done.set()
+
+    def _update(self, channel, name, ident, hostname, flags):
+        network = self.network
+        ch = network.channels.get(channel)
+        if ch is None:
+            nick = network.users.get(name)
+            if nick is not None:
+                nick.set_hostmask(ident, hostname)
+            return
+
+        nick = ch.nicks.get(name)
+        if nick is None:
+            # Left between the WHO and its reply
+            return
+
+        nick.set_hostmask(ident, hostname)
+        # Here/gone and oper flags come first, then the prefixes. Without
+        # multi-prefix only the highest one is shown, so the modes tracked
+        # from MODE are added to, never replaced
+        prefix_map = network.prefix_map
+        grade = 0
+        for c in flags:
+            grade |= prefix_map.get(c, 0)
+
+        ch.set_grade(name, grade)
@@ -0,0 +1,138 @@
+from collections import OrderedDict, deque
+
+import trio
+
+# Sent ahead of everything else and never held back by the buckets
+PRIORITY_COMMANDS = frozenset({"PONG", "PING", "QUIT"})
+LINE_RATE = (2.0, 10)
+BYTE_RATE = (1024.0, 4096)
+EPSILON = 1e-9
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._stamp = None
+
+    def _refill(self):
+        now = trio.current_time()
+        if self._stamp is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+
+        self._stamp = now
+
+    def delay(self, amount):
+        # Seconds to wait before amount tokens are available
+        self._refill()
+        missing = min(amount, self.burst) - self.tokens
+        # Refilling for exactly the delay can fall short by a rounding
+        # error, too small a wait to ever move the clock forward
+        return missing / self.rate if missing > EPSILON else 0
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+
+class FloodControl:
+    def __init__(self, line_rate=LINE_RATE, byte_rate=BYTE_RATE):
+        self.lines = TokenBucket(*line_rate)
+        self.bytes = TokenBucket(*byte_rate)
+        self._priority = deque()
+        # Recipient -> lines waiting for it, served round-robin
+        self._queues = OrderedDict()
+        self._lot = trio.lowlevel.ParkingLot()
+        self._room = trio.lowlevel.ParkingLot()
+        self._size = 0
+        self._seq = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._size
+
+    def put(self, data, target=None, priority=False):
+        self._seq += 1
+        if priority:
+            self._priority.append((self._seq, data))
+        else:
+            queue = self._queues.get(target)
+            if queue is None:
+                queue = self._queues[target] = deque()
+
+            queue.append((self._seq, data))
+
+        self._size += 1
+        self._lot.unpark_all()
+
+    async def get(self):
+        while True:
+            if not self._size:
+                await self._lot.park()
+                continue
+
+            delay = self._delay()
+            if delay == 0:
+                return self._pop()
+
+            # Woken up early if something with priority comes in
+            with trio.move_on_after(delay):
+                await self._lot.park()
+
+    def get_nowait(self, maxbytes=None):
+        if not self._size or self._delay() > 0:
+            raise trio.WouldBlock
+
+        if maxbytes is not None and len(self._peek()) > maxbytes:
+            raise trio.WouldBlock
+
+        return self._pop()
+
+    async def wait_for_room(self, maxsize):
+        while self._size >= maxsize:
+            await self._room.park()
+
+    def drop_oldest(self):
+        if not self._queues:
+            return False
+
+        target = min(self._queues, key=lambda target: self._queues[target][0][0])
+        queue = self._queues[target]
+        queue.popleft()
+        if not queue:
+            del self._queues[target]
+
+        self._size -= 1
+        self.dropped += 1
+        return True
+
+    def _peek(self):
+        if self._priority:
+            return self._priority[0][1]
+
+        return next(iter(self._queues.values()))[0][1]
+
+    def _delay(self):
+        if self._priority:
+            return 0
+
+        size = len(self._peek())
+        return max(self.lines.delay(1), self.bytes.delay(size))
+
+    def _pop(self):
+        if self._priority:
+            _, data = self._priority.popleft()
+        else:
+            target, queue = next(iter(self._queues.items()))
+            _, data = queue.popleft()
+            if queue:
+                self._queues.move_to_end(target)
+            else:
+                del self._queues[target]
+
+        self._size -= 1
+        self._room.unpark_all()
+        self.lines.consume(1)
+        self.bytes.consume(len(data))
+        return data
@@ -6,19 +6,56 @@ import trio
 
 from ..exceptions import DriverConnectionError
 from ..irclib import parser, commands
+from ..irclib.decoder import Decoder, ENCODINGS
+from ..irclib.framer import LineFramer
+from .floodcontrol import FloodControl, LINE_RATE, BYTE_RATE, PRIORITY_COMMANDS
+
+RECV_SIZE = 4096
+WRITE_BATCH = 8192
+SENDQ_SIZE = 256
+# What to do with outgoing lines once SENDQ_SIZE of them are queued
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP = "drop"
+OVERFLOW_MORE = "more"
 
 log = logging.getLogger("mjollnir")
 
 
-def _decode(line):
-    encodings = ('utf8', 'iso-8859-15')
-    for enc in encodings:
-        try:
-            decoded = line.decode(enc)
-        except UnicodeDecodeError:
-            pass
-        else:
-            return decoded
+def _target(msg):
+    if isinstance(msg, str):
+        command = msg.split(" ", 1)[0].upper()
+        return None, command in PRIORITY_COMMANDS
+
+    return msg.recipient, msg.command in PRIORITY_COMMANDS
+
+
+def _encode(msg, buf):
+    if isinstance(msg, str):
+        buf += msg.encode("utf8")
+    else:
+        msg.encode_into(buf)
+
+    buf += b"\r\n"
+
+
+class WriteStats:
+    def __init__(self):
+        self.writes = 0
+        self.lines = 0
+        self.bytes = 0
+
+    def record(self, lines, nbytes):
+        self.writes += 1
+        self.lines += lines
+        self.bytes += nbytes
+
+    @property
+    def lines_per_write(self):
+        return self.lines / self.writes if self.writes else 0
+
+    @property
+    def bytes_per_write(self):
+        return self.bytes / self.writes if self.writes else 0
 
 
 class Driver:
@@ -27,6 +64,18 @@ class Driver:
         self.servers = iter(identity["servers"])
         self.rsendq = rsendq
         self.wsendq = wsendq
+        self.recvsize = identity.get("recvsize", RECV_SIZE)
+        # Yield a list of messages per socket read instead of one at a time
+        self.batched = identity.get("batched", False)
+        # Upper bound in bytes for lines coalesced into a single write
+        self.write_batch = identity.get("write_batch", WRITE_BATCH)
+        self.write_stats = WriteStats()
+        self.sendq_size = identity.get("sendq_size", SENDQ_SIZE)
+        self.overflow = identity.get("sendq_overflow", OVERFLOW_BLOCK)
+        self.flood = FloodControl(identity.get("flood_lines", LINE_RATE),
+            identity.get("flood_bytes", BYTE_RATE))
+        self.decoder = Decoder(identity.get("encodings", ENCODINGS),
+            errors=identity.get("decode_errors", "replace"))
         self._conn = None
         self._socket_connected = trio.Event()
 
@@ -48,32 +97,84 @@ class Driver:
     async def receive(self):
         await self._socket_connected.wait()
 
-        s = bytearray()
+        framer = LineFramer()
+        decode = self.decoder.decode
         while self._conn:
-            mesg = await self._conn.receive_some(4096)
+            mesg = await self._conn.receive_some(self.recvsize)
             if not mesg:
                 raise DriverConnectionError("Connection closed by peer")
 
-            if s:
-                mesg = s + mesg
-                s = bytearray()
-
-            for m in mesg.split(b'\n'):
-                if m.endswith(b'\r'):
-                    m = m.strip()
-                    if m:
-                        decoded = _decode(m)
-                        msg = parser.parse(decoded)
+            lines = framer.feed(mesg)
+            if self.batched:
+                msgs = [parser.parse(decode(line)) for line in lines]
+                msgs = [msg for msg in msgs if msg is not None]
+                if msgs:
+                    yield msgs
+            else:
+                for line in lines:
+                    decoded = decode(line)
+                    msg = parser.parse(decoded)
+                    if msg is not None:
                         yield msg
-                else:
-                    s += m
 
     async def spool(self):
         await self._socket_connected.wait()
 
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(self._schedule)
+            await self._write()
+
+    async def send(self, msg):
+        target, priority = _target(msg)
+        if priority:
+            # Must not wait behind a full queue
+            self._enqueue(msg, target, priority)
+        else:
+            await self.wsendq.send(msg)
+
+    def send_nowait(self, msg):
+        # Paced like the rest but never waits for room, for the bookkeeper's
+        # own queries: it can't stall behind a full queue
+        target, priority = _target(msg)
+        self._enqueue(msg, target, priority)
+
+    async def _schedule(self):
+        async for msg in self.rsendq:
+            target, priority = _target(msg)
+            if not priority and len(self.flood) >= self.sendq_size:
+                if self.overflow == OVERFLOW_DROP:
+                    self.flood.drop_oldest()
+                else:
+                    await self.flood.wait_for_room(self.sendq_size)
+
+            self._enqueue(msg, target, priority)
+
+    def _enqueue(self, msg, target, priority):
+        buf = bytearray()
+        try:
+            _encode(msg, buf)
+        except ValueError as e:
+            # Only this message is dropped, the queue keeps going
+            log.warning(f"trio_driver Not sending {msg!r}: {e}")
+            return
+
+        self.flood.put(bytes(buf), target, priority)
+
+    async def _write(self):
         while True:
-            msg = await self.rsendq.receive()
-            await self._send(msg)
+            buf = bytearray(await self.flood.get())
+            lines = 1
+            while len(buf) < self.write_batch:
+                try:
+                    data = self.flood.get_nowait(self.write_batch - len(buf))
+                except trio.WouldBlock:
+                    break
+
+                buf += data
+                lines += 1
+
+            await self._conn.send_all(buf)
+            self.write_stats.record(lines, len(buf))
 
     async def _connect(self):
         host = None
@@ -107,15 +208,24 @@ class Driver:
             await self._send(msg)
 
     async def _send(self, msg):
-        if isinstance(msg, str) or not msg.encoded:
-            s = f"{msg}\r\n".encode("utf8")
-        elif msg.encoded:
-            s = bytes(msg) + b"\r\n"
-        else:
-            log.warning(f"trio_driver._send Ignoring request to send '{msg}'")
-            return
+        buf = bytearray()
+        _encode(msg, buf)
+        await self._conn.send_all(buf)
 
-        await self._conn.send_all(s)
+    @property
+    def queue_depth(self):
+        # _schedule stops taking from rsendq once FloodControl is full, so
+        # with an unbuffered channel (mjollnir.py) this is at most sendq_size.
+        # A buffered one would hold up to its own size more on top of that
+        return self.wsendq.statistics().current_buffer_used + len(self.flood)
+
+    def idle(self, lines=1):
+        # Nothing waiting to go out and room for lines more without delay
+        return not self.queue_depth and self.flood.lines.delay(lines) == 0
+
+    @property
+    def queue_full(self):
+        return self.queue_depth >= self.sendq_size
 
     @property
     def connected(self):
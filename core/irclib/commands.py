@@ -108,6 +108,14 @@ def whois(nick):
     return IRCMsg(type=MsgType.SERVERCMD, command="WHOIS", args=[nick])
 
 
+def who(mask, fields=None):
+    args = [mask]
+    if fields:
+        args.append(fields)
+
+    return IRCMsg(type=MsgType.SERVERCMD, command="WHO", args=args)
+
+
 def pong(daemon, daemon2=None):
     args = [daemon]
     if daemon2:
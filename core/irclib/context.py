@@ -3,14 +3,25 @@ from .. import utils
 from ..mixins import IRCMsg, Nick
 from ..enums import MsgType
 
-MAP_RFC1459 = str.maketrans("{|}~", r"[\]^")
-MAP_STRICT_RFC1459 = str.maketrans("{|}", r"[\]")
+CONTEXT_POOL_SIZE = 32
+
+
+class NetworkSnapshot:
+    # Picklable stand-in for Network, enough to back a detached IRCContext
+    def __init__(self, network):
+        self.name = network.name
+        self.identity = dict(network.identity)
+        self.hostname = network.hostname
+        self.capabilities = dict(network.capabilities)
+        self.casemapping = network.casemapping
 
 
 class IRCContext:
     def __init__(self, network):
         self.incoming = None
         self.network = network
+        # Still held by a worker thread that was given up on
+        self.abandoned = False
         self.reset_responses()
 
     def _reply(self, text, *, action=False, notice=False):
@@ -62,23 +73,13 @@ class IRCContext:
         self._enqueue(msg)
 
     def nick_tolower(self, nick):
-        casing = self.network.capabilities["CASEMAPPING"]
-
-        if casing == "rfc1459":
-            return nick.translate(MAP_RFC1459).lower()
-        elif casing == "strict-rfc1459":
-            return nick.translate(MAP_STRICT_RFC1459).lower()
-        elif casing == "ascii":
-            return nick.lower()
-        else:
-            raise ValueError(f"Invalid CASEMAPPING '{casing}'")
+        return self.network.casemapping.fold(nick)
 
     def nick_isin(self, nick, channel):
-        for other in channel:
-            if self.nick_cmp(nick, other):
-                return True
+        if isinstance(nick, Nick):
+            nick = nick.name
 
-        return False
+        return nick in channel
 
     def nick_cmp(self, a, b):
         if isinstance(a, Nick):
@@ -104,6 +105,11 @@ class IRCContext:
         else:
             return msg.nick
 
+    def detached(self):
+        ctx = IRCContext(NetworkSnapshot(self.network))
+        ctx.set_message(self.incoming)
+        return ctx
+
     def set_message(self, msg):
         self.incoming = msg
 
@@ -115,4 +121,28 @@ class IRCContext:
         msg.nick = identity["nick"]
         msg.ident = identity["ident"]
         msg.hostname = self.network.hostname
-        self.responses.append(msg)
\ No newline at end of file
+        self.responses.append(msg)
+
+
+class ContextPool:
+    def __init__(self, network, size=CONTEXT_POOL_SIZE):
+        self.network = network
+        self.size = size
+        self._free = []
+
+    def acquire(self, msg):
+        ctx = self._free.pop() if self._free else IRCContext(self.network)
+        ctx.set_message(msg)
+        return ctx
+
+    def release(self, ctx):
+        if ctx.abandoned:
+            # Left to the thread, its late replies must not leak into the
+            # next invocation
+            return
+
+        # Anyone still holding the old responses list keeps it intact
+        ctx.set_message(None)
+        ctx.reset_responses()
+        if len(self._free) < self.size:
+            self._free.append(ctx)
@@ -0,0 +1,69 @@
+import re
+from collections import OrderedDict
+
+ENCODINGS = ("utf8", "iso-8859-15")
+CACHE_SIZE = 1024
+
+# A lead byte followed by a continuation byte, rare in 8-bit encoded text
+utf8_seq_re = re.compile(rb"[\xc2-\xf4][\x80-\xbf]")
+
+
+def _sender(line):
+    # Nickname or server name from the line prefix, as bytes
+    pos = 0
+    if line.startswith(b"@"):
+        pos = line.find(b" ") + 1
+        if pos == 0:
+            return None
+
+    if not line.startswith(b":", pos):
+        return None
+
+    end = line.find(b" ", pos)
+    if end == -1:
+        return None
+
+    bang = line.find(b"!", pos, end)
+    return line[pos + 1:end if bang == -1 else bang]
+
+
+class Decoder:
+    def __init__(self, encodings=ENCODINGS, errors="replace", cachesize=CACHE_SIZE):
+        self.encodings = tuple(encodings)
+        self.errors = errors
+        self.cachesize = cachesize
+        # Sender -> fallback encoding which last worked for it
+        self._fallbacks = OrderedDict()
+
+    def decode(self, line):
+        if line.isascii():
+            return line.decode("ascii")
+
+        sender = _sender(line)
+        enc = self._fallbacks.get(sender) if sender is not None else None
+        if enc is not None and not utf8_seq_re.search(line):
+            try:
+                decoded = line.decode(enc)
+            except UnicodeDecodeError:
+                self._fallbacks.pop(sender)
+            else:
+                self._fallbacks.move_to_end(sender)
+                return decoded
+
+        for idx, enc in enumerate(self.encodings):
+            try:
+                decoded = line.decode(enc)
+            except UnicodeDecodeError:
+                pass
+            else:
+                if idx > 0 and sender is not None:
+                    self._remember(sender, enc)
+
+                return decoded
+
+        return line.decode(self.encodings[0], self.errors)
+
+    def _remember(self, sender, enc):
+        self._fallbacks[sender] = enc
+        if len(self._fallbacks) > self.cachesize:
+            self._fallbacks.popitem(last=False)
@@ -0,0 +1,60 @@
+import logging
+
+# 512 bytes for the message itself plus 8191 for IRCv3 message tags
+MAX_LINE_LENGTH = 512 + 8191
+
+log = logging.getLogger("mjollnir")
+
+
+class LineFramer:
+    def __init__(self, maxlen=MAX_LINE_LENGTH):
+        self.maxlen = maxlen
+        self.reset()
+
+    def reset(self):
+        self._buf = bytearray()
+        # Bytes of self._buf already known not to contain a line feed
+        self._scanned = 0
+        self._discarding = False
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+
+        lines = []
+        last = buf.rfind(b"\n", self._scanned)
+        if last != -1:
+            # Complete lines are copied out in one go and split in C; the
+            # view is released before buf shrinks
+            with memoryview(buf) as view:
+                complete = view[:last].tobytes().split(b"\n")
+
+            del buf[:last + 1]
+            if self._discarding:
+                # Tail of an overlong line, drop it
+                self._discarding = False
+                del complete[0]
+
+            maxlen = self.maxlen
+            for line in complete:
+                if line[-1:] == b"\r":
+                    line = line[:-1]
+
+                if len(line) > maxlen:
+                    # Completed within a single read, never seen as leftover
+                    log.warning(f"framer.feed Dropping line longer than {maxlen} bytes")
+                elif line:
+                    lines.append(line)
+
+        # One more byte for a CR whose LF hasn't arrived yet
+        if len(buf) > self.maxlen + 1:
+            log.warning(f"framer.feed Dropping line longer than {self.maxlen} bytes")
+            buf.clear()
+            self._discarding = True
+
+        self._scanned = len(buf)
+        return lines
+
+    @property
+    def pending(self):
+        return len(self._buf)
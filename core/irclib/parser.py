@@ -1,45 +1,54 @@
 import logging
 import re
+import sys
 
-from ..mixins import IRCMsg
+from ..mixins import IRCMsg, _FIRST_ARG
 from ..enums import MsgType
 
 
-sender_re = re.compile(r'^(\S+)!(\S+)@(\S+)$')
 ctcp_re = re.compile(
     r"^\x01"
     r"([^ \x00\x01\n\r]+) ?"
     r"([^\x00\x01\n\r]+)?"
     r"\x01$")
+tag_escape_re = re.compile(r"\\(.?)")
+# Tags, prefix and command in one pass, the parameters start at its end
+line_re = re.compile(r"(?:@([^ ]*) +)?(?::([^ ]*) +)?([^ ]+) *")
+TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
 
 log = logging.getLogger("mjollnir")
 
 
-def _split_hostmask(sender):
-    nick, ident, hostname = (None, None, None)
-    try:
-        m = sender_re.match(sender)
-        if m:
-            nick, ident, hostname = m.groups()
-        else:
-            raise ValueError
-    except ValueError:
-        nick = sender
-    except TypeError:
-        pass
+def _unescape_tag(m):
+    c = m.group(1)
+    return TAG_ESCAPES.get(c, c)
+
 
-    return nick, ident, hostname
+def _parse_tags(rawtags):
+    tags = {}
+    for tag in rawtags.split(";"):
+        if not tag:
+            continue
 
+        key, sep, value = tag.partition("=")
+        if "\\" in value:
+            value = tag_escape_re.sub(_unescape_tag, value)
 
-def _decode_command(line, ircmsg):
-    cmd, text = (ircmsg.command, ircmsg.args[-1])
+        tags[key] = value
 
-    if not line.startswith(":"):
+    return tags
+
+
+def _decode_command(ircmsg, prefixed):
+    cmd = ircmsg.command
+
+    if not prefixed:
         cmdtype = MsgType.SERVERCMD
     elif cmd.isdigit():
         cmdtype = MsgType.NUMERIC
     elif cmd == "NOTICE":
-        m = ctcp_re.match(text)
+        text = ircmsg.args[-1]
+        m = ctcp_re.match(text) if text.startswith("\x01") else None
         if m:
             cmdtype = MsgType.CTCPREPLY
             # Normalize to UPPERCASE
@@ -47,9 +56,11 @@ def _decode_command(line, ircmsg):
             ircmsg.text = m.group(2) or ''
         else:
             cmdtype = MsgType.NOTICE
-            ircmsg.text = text
+            # Already the last argument, the setter has nothing to write
+            ircmsg._text = text
     elif cmd == "PRIVMSG":
-        m = ctcp_re.match(text)
+        text = ircmsg.args[-1]
+        m = ctcp_re.match(text) if text.startswith("\x01") else None
         if m:
             # Normalize to UPPERCASE
             ctcpname = m.group(1).upper()
@@ -62,42 +73,47 @@ def _decode_command(line, ircmsg):
             ircmsg.text = m.group(2) or ''
         else:
             cmdtype = MsgType.REGULAR
-            ircmsg.text = text
+            ircmsg._text = text
     else:
         cmdtype = MsgType.CLIENTCMD
 
     return cmdtype
 
 
-def parse(line):
-    ircmsg = IRCMsg()
-    try:
-        first, rest = line.split(" ", 1)
-        if first.startswith(":"):
-            ircmsg.command, rest = rest.split(" ", 1)
-            ircmsg.nick, ircmsg.ident, ircmsg.hostname = _split_hostmask(first[1:])
-        else:
-            ircmsg.command = first
+def _scan(line):
+    m = line_re.match(line)
+    if m is None:
+        raise ValueError
 
-        # Normalize to UPPERCASE
-        ircmsg.command = ircmsg.command.upper()
+    rawtags, prefix, command = m.groups()
+    # A tags or prefix word not followed by a space ends up as the command
+    if prefix is None and (command[0] == ":" or rawtags is None and command[0] == "@"):
+        raise ValueError
+
+    tags = _parse_tags(rawtags) if rawtags is not None else None
+    return tags, prefix, command, m.end()
 
-        while not rest.startswith(":"):
-            try:
-                arg, rest = rest.split(" ", 1)
-            except ValueError:
-                ircmsg.args.append(rest)
-                break
-            else:
-                ircmsg.args.append(arg)
-        else:
-            ircmsg.args.append(rest[1:])
 
-        ircmsg.type = _decode_command(line, ircmsg)
-        if ircmsg.command in ("PRIVMSG", "NOTICE", "MODE") or ircmsg.command.isdigit():
-            ircmsg.recipient = ircmsg.args[0]
+def parse(line):
+    try:
+        tags, prefix, command, argpos = _scan(line)
     except ValueError:
         log.debug("parser.parse failed parsing message:\r\n '%s'", line)
-        ircmsg.text = line
+        return None
+
+    # Normalize to UPPERCASE, interned as a handful of commands make up
+    # nearly every line
+    command = sys.intern(command.upper())
+    ircmsg = IRCMsg(command=command, prefix=prefix, tags=tags, line=line,
+        argpos=argpos)
+    try:
+        ircmsg.type = _decode_command(ircmsg, prefix is not None)
+    except IndexError:
+        # PRIVMSG and NOTICE can't do without their text
+        log.debug("parser.parse missing arguments in message:\r\n '%s'", line)
+        return None
+
+    if command in ("PRIVMSG", "NOTICE", "MODE") or command.isdigit():
+        ircmsg.recipient = _FIRST_ARG
 
     return ircmsg
@@ -1,40 +1,266 @@
 import logging
 import random
 import string
-from collections import defaultdict
+import sys
+import types
+
+import trio
 
 from .enums import MsgType
-from .irclib import commands
 
 log = logging.getLogger("mjollnir")
 
 
+SINK_QUEUE = 64
+# What a sink does with messages once its queue is full
+SINK_BLOCK = "block"
+SINK_DROP = "drop"
+# Seconds between two warnings about a sink dropping messages
+DROP_WARN_INTERVAL = 60
+
+
+class Sink:
+    def __init__(self, cb, events, batch, concurrency=None, key=None,
+        queuesize=SINK_QUEUE, commands=None, overflow=SINK_BLOCK):
+        self.cb = cb
+        self.events = events
+        # None lets every command through
+        self.commands = frozenset(commands) if commands is not None else None
+        self.batch = batch
+        # None keeps the sink strictly serial, otherwise up to concurrency
+        # invocations run at once for each key(msg)
+        self.concurrency = concurrency
+        self.key = key
+        self.queuesize = queuesize
+        # Blocking holds up the pump and every sink behind it, only sinks
+        # that must see every message in order should do that
+        self.overflow = overflow
+        self.dropped = 0
+        # When the last drop warning went out, and the count back then
+        self._warned_at = None
+        self._warned_dropped = 0
+        self.wsendq, self.rsendq = trio.open_memory_channel(queuesize)
+        self.lanes = {}
+        # Where lanes run, put() feeds them directly
+        self._nursery = None
+        self._closed = trio.Event()
+
+    def wants(self, msgs):
+        if self.commands is not None:
+            commands = self.commands
+            msgs = [msg for msg in msgs if msg.command in commands]
+
+        if MsgType.ALL in self.events:
+            return msgs
+
+        return [msg for msg in msgs if msg.type in self.events]
+
+    async def put(self, msgs):
+        items = [msgs] if self.batch else msgs
+        for item in items:
+            if self.concurrency is None:
+                await self._send(self.wsendq, item)
+            else:
+                await self._send(self._lane(self.key(item)), item)
+
+    async def _send(self, channel, item):
+        if self.overflow == SINK_DROP:
+            try:
+                channel.send_nowait(item)
+            except trio.WouldBlock:
+                self.dropped += 1
+                self._warn_dropped()
+        else:
+            await channel.send(item)
+
+    def _warn_dropped(self):
+        now = trio.current_time()
+        if self._warned_at is not None and now - self._warned_at < DROP_WARN_INTERVAL:
+            return
+
+        log.warning(f"mixins.Sink Overloaded, dropped {self.dropped - self._warned_dropped} "
+            f"messages for {self.cb} ({self.dropped} in total)")
+        self._warned_at = now
+        self._warned_dropped = self.dropped
+
+    def close(self):
+        self.wsendq.close()
+        self._closed.set()
+
+    async def run(self, task_status=trio.TASK_STATUS_IGNORED):
+        if self.concurrency is None:
+            task_status.started()
+            async for item in self.rsendq:
+                await self.cb(item)
+        else:
+            async with trio.open_nursery() as self._nursery:
+                task_status.started()
+                await self._closed.wait()
+                for lane in self.lanes.values():
+                    lane.close()
+
+    def _lane(self, key):
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane, rlane = trio.open_memory_channel(self.queuesize)
+            self.lanes[key] = lane
+            self._nursery.start_soon(self._run_lane, rlane)
+
+        return lane
+
+    async def _run_lane(self, rlane):
+        slots = trio.Semaphore(self.concurrency)
+        async with trio.open_nursery() as nursery:
+            async for item in rlane:
+                await slots.acquire()
+                nursery.start_soon(self._invoke, item, slots)
+
+    async def _invoke(self, item, slots):
+        try:
+            await self.cb(item)
+        finally:
+            slots.release()
+
+
 class MessagePump:
     def __init__(self):
         self.source = None
-        self.sinks = defaultdict(list)
+        self.batched = False
+        self.sinks = []
 
-    def attach_source(self, source):
+    def attach_source(self, source, batched=False):
         self.source = source
+        self.batched = batched
+
+    def add_sink(self, cb, events, **kwargs):
+        self._add_sink(cb, events, batch=False, **kwargs)
 
-    def add_sink(self, cb, events):
-        for event in events:
-            if type(event) is MsgType:
-                self.sinks[event].append(cb)
+    def add_batch_sink(self, cb, events, **kwargs):
+        self._add_sink(cb, events, batch=True, **kwargs)
 
     def remove_sink(self, cb):
-        self.sinks.pop(cb)
+        for sink in self.sinks:
+            if sink.cb == cb:
+                sink.close()
+
+        self.sinks = [sink for sink in self.sinks if sink.cb != cb]
+
+    def _add_sink(self, cb, events, batch, **kwargs):
+        events = frozenset(event for event in events if type(event) is MsgType)
+        if events:
+            self.sinks.append(Sink(cb, events, batch, **kwargs))
 
     async def run(self):
         if self.source is None:
             raise RuntimeError("No source attached")
 
-        async for msg in self.source():
-            for cb in self.sinks.get(msg.type, []):
-                await cb(msg)
+        # Every sink drains its own queue, a slow one can't hold up the rest
+        async with trio.open_nursery() as nursery:
+            for sink in self.sinks:
+                await nursery.start(sink.run)
+
+            async for item in self.source():
+                if self.batched:
+                    await self._deliver(item)
+                else:
+                    await self._deliver([item])
+
+            for sink in self.sinks:
+                sink.close()
+
+    async def _deliver(self, msgs):
+        for sink in self.sinks:
+            wanted = sink.wants(msgs)
+            if wanted:
+                await sink.put(wanted)
+
+
+def _casemap(upper, lower):
+    # A string table translates faster than a dict, anything past it is kept
+    table = str.maketrans(upper, lower)
+    return "".join(chr(table.get(cp, cp)) for cp in range(128))
+
+
+CASEMAPPINGS = {
+    "ascii": _casemap(string.ascii_uppercase, string.ascii_lowercase),
+    "rfc1459": _casemap(string.ascii_uppercase + "[]\\^",
+        string.ascii_lowercase + "{}|~"),
+    "strict-rfc1459": _casemap(string.ascii_uppercase + "[]\\",
+        string.ascii_lowercase + "{}|"),
+}
+# What RFC 1459 servers use when CASEMAPPING isn't advertised
+DEFAULT_CASEMAPPING = "rfc1459"
+# Same for PREFIX
+DEFAULT_PREFIX = "(ov)@+"
+
+
+class CaseMapping:
+    def __init__(self, name=DEFAULT_CASEMAPPING):
+        self.set(name)
+
+    def set(self, name):
+        table = CASEMAPPINGS.get(name)
+        if table is None:
+            raise ValueError(f"Invalid CASEMAPPING '{name}'")
+
+        self.name = name
+        self.table = table
+        # Same mapping for bytes, ASCII names go through it several times faster
+        self.bytes_table = table.encode() + bytes(range(128, 256))
+
+    def fold(self, name):
+        if name.isascii():
+            return name.encode().translate(self.bytes_table).decode()
+
+        return name.translate(self.table)
+
+
+class IRCDict:
+    # Keyed by casemapped name, values carry their own name attribute
+    __slots__ = ("casemapping", "_values")
+
+    def __init__(self, casemapping):
+        self.casemapping = casemapping
+        self._values = {}
+
+    def __getitem__(self, name):
+        return self._values[self.casemapping.fold(name)]
 
-            for cb in self.sinks.get(MsgType.ALL, []):
-                await cb(msg)
+    def __setitem__(self, name, value):
+        # Interned, a nick in many channels shares a single key
+        self._values[sys.intern(self.casemapping.fold(name))] = value
+
+    def __delitem__(self, name):
+        del self._values[self.casemapping.fold(name)]
+
+    def __contains__(self, name):
+        return self.casemapping.fold(name) in self._values
+
+    def __iter__(self):
+        for value in self._values.values():
+            yield value.name
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, name, default=None):
+        return self._values.get(self.casemapping.fold(name), default)
+
+    def pop(self, name, *default):
+        return self._values.pop(self.casemapping.fold(name), *default)
+
+    def values(self):
+        return self._values.values()
+
+    def items(self):
+        for value in self._values.values():
+            yield value.name, value
+
+    def refold(self):
+        values = list(self._values.values())
+        self._values.clear()
+        for value in values:
+            self[value.name] = value
 
 
 class Network:
@@ -48,11 +274,19 @@ class Network:
         self.chanmodes = set()
         self.maxmodes = -1
         self.excepts_mode = ""
-        self.prefix_modes = []
-        self.prefix_literals = []
+        self.prefix_modes = ""
+        self.prefix_literals = ""
+        # Prefix mode -> bit in Channel.grades, the highest ranking is bit 0
+        self.prefix_bits = {}
+        # Same, by the prefix character shown in NAMES
+        self.prefix_map = {}
+        self.set_prefix(DEFAULT_PREFIX)
         self.capabilities = {}
         self.targmax = {}
-        self.channels = {}
+        self.casemapping = CaseMapping()
+        self.channels = IRCDict(self.casemapping)
+        # Nickname -> the one Nick record shared by all its channels
+        self.users = IRCDict(self.casemapping)
 
     @property
     def name(self):
@@ -65,6 +299,125 @@ class Network:
     def __contains__(self, other):
         return other == self.name
 
+    def set_casemapping(self, name):
+        self.casemapping.set(name)
+        self.channels.refold()
+        self.users.refold()
+        for channel in self.channels.values():
+            channel.nicks.refold()
+
+    def set_prefix(self, value):
+        # "(modes)literals", empty when the network has no prefixes
+        modes, _, literals = value.partition(")")
+        modes = modes[1:]
+        self.prefix_modes = modes
+        self.prefix_literals = literals
+        self.prefix_bits = {mode: 1 << idx for idx, mode in enumerate(modes)}
+        self.prefix_map = {literal: 1 << idx for idx, literal in enumerate(literals)}
+
+    def add_channel(self, name):
+        # Rejoined without a PART seen, e.g. after a KICK: start over, the
+        # old members would keep pointing at the stale Channel
+        if name in self.channels:
+            self.remove_channel(name)
+
+        channel = Channel(name, self.casemapping)
+        self.channels[name] = channel
+        return channel
+
+    def remove_channel(self, name):
+        channel = self.channels.pop(name)
+        for nick in list(channel.nicks.values()):
+            self._unlink(nick, channel)
+
+    def add_member(self, channel, name, ident=None, hostname=None):
+        channel = self.channels[channel]
+        # Folded once for both indexes, as in commit_members
+        key = sys.intern(self.casemapping.fold(name))
+        users = self.users._values
+        nick = users.get(key)
+        if nick is None:
+            nick = users[key] = Nick(name)
+
+        if ident is not None:
+            nick.set_hostmask(ident, hostname)
+
+        channel.nicks._values[key] = nick
+        nick.channels.add(channel)
+        return nick
+
+    def commit_members(self, channel, members):
+        # A complete member list, as (name, ident, hostname, grade), replaces
+        # the current one. Keys are folded once and shared by both indexes
+        channel = self.channels[channel]
+        fold = self.casemapping.fold
+        users = self.users._values
+        nicks = channel.nicks._values
+        grades = channel.grades
+        seen = set()
+
+        for name, ident, hostname, grade in members:
+            key = sys.intern(fold(name))
+            seen.add(key)
+            nick = users.get(key)
+            if nick is None:
+                nick = users[key] = Nick(name)
+
+            if ident is not None:
+                nick.set_hostmask(ident, hostname)
+
+            nicks[key] = nick
+            nick.channels.add(channel)
+            if grade:
+                grades[nick] = grade
+            else:
+                grades.pop(nick, None)
+
+        if len(nicks) > len(seen):
+            for key in [key for key in nicks if key not in seen]:
+                nick = nicks.pop(key)
+                grades.pop(nick, None)
+                self._unlink(nick, channel)
+
+    def remove_member(self, channel, name):
+        channel = self.channels[channel]
+        key = self.casemapping.fold(name)
+        nick = channel.nicks._values.pop(key)
+        channel.grades.pop(nick, None)
+        nick.channels.discard(channel)
+        if not nick.channels:
+            self.users._values.pop(key, None)
+
+    def remove_user(self, name):
+        key = self.casemapping.fold(name)
+        nick = self.users._values.pop(key, None)
+        if nick is not None:
+            for channel in nick.channels:
+                channel.nicks._values.pop(key, None)
+                channel.grades.pop(nick, None)
+
+    def rename_user(self, name, newname):
+        fold = self.casemapping.fold
+        key = fold(name)
+        users = self.users._values
+        nick = users.pop(key, None)
+        if nick is None:
+            return
+
+        newkey = sys.intern(fold(newname))
+        for channel in nick.channels:
+            nicks = channel.nicks._values
+            del nicks[key]
+            nicks[newkey] = nick
+
+        nick.rename(newname)
+        users[newkey] = nick
+
+    def _unlink(self, nick, channel):
+        nick.channels.discard(channel)
+        if not nick.channels:
+            self.users.pop(nick.name, None)
+
     def _nicknames(self):
         nick = self.identity["altnick"]
         while True:
@@ -73,103 +426,302 @@ class Network:
                 random.randint(0, 99))
 
 
+class Topic:
+    __slots__ = ("text", "setby", "timestamp")
+
+    def __init__(self):
+        self.text = ''
+        self.setby = ''
+        self.timestamp = ''
+
+
 class Channel:
-    def __init__(self, channelname):
+    __slots__ = ("name", "topic", "modes", "nicks", "grades", "bans", "excepts",
+        "names")
+
+    def __init__(self, channelname, casemapping):
         self.name = channelname
-        self.topic = dict(
-            text='',
-            setby='',
-            timestamp=''
-        )
+        self.topic = Topic()
         self.modes = {}
-        self.nicks = {}
+        self.nicks = IRCDict(casemapping)
+        # Nick -> bitmask of its prefix modes here, only when not zero
+        self.grades = {}
         self.bans = {}
         self.excepts = {}
+        # RPL_NAMREPLY entries waiting for RPL_ENDOFNAMES
+        self.names = []
 
     def __iter__(self):
         for nick in self.nicks:
             yield nick
 
+    def __contains__(self, nick):
+        return nick in self.nicks
+
+    # Members are indexed by the Channel objects they're in, a network keeps
+    # one per casemapped name so identity and equality agree
+    __hash__ = object.__hash__
+
     def __eq__(self, other):
-        if isinstance(other, str):
-            return self.name.lower() == other.lower()
-        elif isinstance(other, Channel):
-            return self.name.lower() == other.name.lower()
-        else:
+        if isinstance(other, Channel):
+            other = other.name
+        elif not isinstance(other, str):
             return False
 
+        fold = self.nicks.casemapping.fold
+        return fold(self.name) == fold(other)
+
     def __str__(self):
         return self.name
 
+    def grade(self, name):
+        nick = self.nicks.get(name)
+        return self.grades.get(nick, 0) if nick is not None else 0
+
+    def set_grade(self, name, bits, on=True):
+        nick = self.nicks.get(name)
+        if nick is None or not bits:
+            return
+
+        grade = self.grades.get(nick, 0)
+        grade = grade | bits if on else grade & ~bits
+        if grade:
+            self.grades[nick] = grade
+        else:
+            self.grades.pop(nick, None)
+
 
 class Nick:
+    __slots__ = ("name", "ident", "hostname", "channels")
+
     def __init__(self, name):
         self.name = name
         self.ident = None
         self.hostname = None
-        self.grade = set()
+        # Channels we share with this user
+        self.channels = set()
 
     def rename(self, newnick):
         self.name = newnick
 
+    def set_hostmask(self, ident, hostname):
+        # Interned, thousands of users share a handful of hosts and idents
+        self.ident = sys.intern(ident)
+        self.hostname = sys.intern(hostname) if hostname is not None else None
 
-def _ctcp(name, args=None):
-    if args:
-        return f"\x01{name} {args}\x01"
+
+PRIVMSG_TYPES = (MsgType.REGULAR, MsgType.ACTION, MsgType.CTCP)
+NOTICE_TYPES = (MsgType.NOTICE, MsgType.CTCPREPLY)
+CTCP_TYPES = (MsgType.ACTION, MsgType.CTCP, MsgType.CTCPREPLY)
+
+
+def _put(buf, arg):
+    if isinstance(arg, str):
+        buf += arg.encode()
+    elif isinstance(arg, (bytes, bytearray, memoryview)):
+        buf += arg
     else:
-        return f"\x01{name}\x01"
+        buf += str(arg).encode()
 
 
-def _join_args(args):
-    L = []
-    space_found = False
-    for arg in map(str, args):
-        if not space_found and " " in arg:
-            L.append(f":{arg}")
-            space_found = True
-        else:
-            L.append(arg)
+def _put_middle(buf, arg):
+    # Only the last parameter may be empty or hold a space or a leading colon
+    start = len(buf)
+    _put(buf, arg)
+    if start == len(buf) or buf[start] == 0x3A or buf.find(b" ", start) != -1:
+        raise ValueError(f"Invalid middle parameter {arg!r}")
 
-    return " ".join(L) or None
 
-# FIXME
-def _join_args_bytes(args):
-    L = []
-    space_found = False
-    for arg in args:
-        if isinstance(arg, str):
-            arg = arg.encode()
+def _put_trailing(buf, arg, always):
+    if isinstance(arg, str):
+        arg = arg.encode()
+    elif isinstance(arg, memoryview):
+        if not always:
+            arg = bytes(arg)
+    elif not isinstance(arg, (bytes, bytearray)):
+        arg = str(arg).encode()
 
-        if not space_found and b" " in arg:
-            L.append(b":" + arg)
-            space_found = True
-        else:
-            L.append(arg)
+    if always or not arg or b" " in arg or arg[:1] == b":":
+        buf += b":"
+
+    buf += arg
+
+
+def _split_hostmask(prefix):
+    # Same outcome as matching ^(\S+)!(\S+)@(\S+)$, without the regex
+    rest, _, hostname = prefix.rpartition("@")
+    nick, _, ident = rest.rpartition("!")
+    if nick and ident and hostname:
+        return nick, ident, hostname
+
+    return prefix, None, None
+
+
+def _split_args(line, pos):
+    # Middle parameters are separated by one or more spaces, the trailing
+    # one starts at the first " :" past them
+    if line.startswith(":", pos):
+        return [line[pos + 1:]]
+
+    end = line.find(" :", pos)
+    if end == -1:
+        middle = line[pos:]
+        trailing = None
+    else:
+        middle = line[pos:end]
+        trailing = line[end + 2:]
+
+    if "  " in middle or middle[:1] == " " or middle[-1:] == " ":
+        args = [arg for arg in middle.split(" ") if arg]
+    elif middle:
+        args = middle.split(" ")
+    else:
+        args = []
+
+    if trailing is not None:
+        args.append(trailing)
 
-    return b" ".join(L) or None
+    return args
+
+
+# Marks a recipient still to be taken from the first argument
+_FIRST_ARG = object()
+# Shared by every message without tags, read-only so nobody writes to it
+_NO_TAGS = types.MappingProxyType({})
 
 
 class IRCMsg:
+    __slots__ = ("_line", "_argpos", "_args", "_shared", "_prefix", "_nick",
+        "_ident", "_hostname", "_recipient", "type", "ctcpname", "command",
+        "_text", "encoded", "tags")
+
     def __init__(self, nick=None, ident=None, hostname=None, recipient=None,
-        type=None, ctcp=None, command=None, args=None, text='', encoded=False):
-        self.nick = nick
-        self.ident = ident
-        self.hostname = hostname
-        self.recipient = recipient
+        type=None, ctcp=None, command=None, args=None, text='', encoded=False,
+        prefix=None, tags=None, line=None, argpos=0):
+        # Parsed messages keep the raw line and split their arguments out of
+        # it on first access, the hostmask is split only when needed as well
+        self._line = line
+        self._argpos = argpos
+        self._args = None if line is not None else args or []
+        # Arguments list is shared with a copy, clone it before writing
+        self._shared = False
+        self._prefix = prefix
+        self._nick = nick
+        self._ident = ident
+        self._hostname = hostname
+        self._recipient = recipient
         self.type = type
         self.ctcpname = ctcp
         self.command = command
-        self.args = args or []
         self._text = text
         self.encoded = encoded
+        self.tags = tags or _NO_TAGS
 
     def copy(self):
-        return IRCMsg(self.nick, self.ident, self.hostname, self.recipient,
-            self.type, self.ctcpname, self.command, self.args.copy(),
-            self.text, self.encoded)
+        msg = IRCMsg(self._nick, self._ident, self._hostname, self.recipient,
+            self.type, self.ctcpname, self.command, self.args, self.text,
+            self.encoded, self._prefix, self.tags)
+        msg._shared = self._shared = True
+        return msg
+
+    def __getstate__(self):
+        # The lazy recipient marker would not survive pickling, nor would
+        # the shared empty tags
+        self.recipient
+        state = {slot: getattr(self, slot) for slot in self.__slots__}
+        if self.tags is _NO_TAGS:
+            state["tags"] = None
+
+        return state
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+        self.tags = self.tags or _NO_TAGS
+
+    def _split_prefix(self):
+        if self._prefix is not None:
+            self._nick, self._ident, self._hostname = _split_hostmask(self._prefix)
+            self._prefix = None
+
+    def _own_args(self):
+        if self._shared:
+            self._args = self.args.copy()
+            self._shared = False
+
+        return self.args
+
+    @property
+    def args(self):
+        if self._args is None:
+            self._args = _split_args(self._line, self._argpos)
+            # Nothing else reads the line, don't keep both alive
+            self._line = None
+
+        return self._args
+
+    @args.setter
+    def args(self, args):
+        self._args = args
+        self._shared = False
+
+    @property
+    def recipient(self):
+        if self._recipient is _FIRST_ARG:
+            args = self._args
+            if args is None:
+                args = self.args
+
+            self._recipient = args[0] if args else None
+
+        return self._recipient
+
+    @recipient.setter
+    def recipient(self, recipient):
+        self._recipient = recipient
+
+    @property
+    def nick(self):
+        if self._prefix is not None:
+            self._split_prefix()
+
+        return self._nick
+
+    @nick.setter
+    def nick(self, nick):
+        self._split_prefix()
+        self._nick = nick
+
+    @property
+    def ident(self):
+        if self._prefix is not None:
+            self._split_prefix()
+
+        return self._ident
+
+    @ident.setter
+    def ident(self, ident):
+        self._split_prefix()
+        self._ident = ident
+
+    @property
+    def hostname(self):
+        if self._prefix is not None:
+            self._split_prefix()
+
+        return self._hostname
+
+    @hostname.setter
+    def hostname(self, hostname):
+        self._split_prefix()
+        self._hostname = hostname
 
     @property
     def sender(self):
+        if self._prefix is not None:
+            return self._prefix
+
         if self.nick is None and self.ident is None and self.hostname is None:
             return
 
@@ -191,15 +743,18 @@ class IRCMsg:
 
     @text.setter
     def text(self, text):
-        self.args[-1] = text
+        self._own_args()[-1] = text
         self._text = text
 
     def __iadd__(self, other):
         if isinstance(other, IRCMsg):
             other = other.text
 
-        self.args[-1] = self.args[-1] + other
-        self.text = self.text + other
+        text = self.text
+        if isinstance(text, memoryview):
+            text = bytes(text)
+
+        self.text = text + other
         return self
 
     def __repr__(self):
@@ -210,76 +765,48 @@ class IRCMsg:
                  self.args)
 
     def __str__(self):
-        s = ""
-
-        if self.type in (MsgType.ACTION, MsgType.CTCP, MsgType.CTCPREPLY):
-            if self.type is MsgType.ACTION:
-                ctcpname = "ACTION"
-            else:
-                ctcpname = self.ctcpname
+        return bytes(self).decode(errors="replace")
 
-            if len(self.args) > 1:
-                ctcpbody = _ctcp(ctcpname, " ".join(self.args[1:]))
-            else:
-                ctcpbody = _ctcp(ctcpname)
-
-            args = [self.args[0], ctcpbody]
-        else:
-            args = self.args
-
-        args = _join_args(args)
-
-        if self.type in (MsgType.REGULAR, MsgType.ACTION, MsgType.CTCP):
-            s = f"PRIVMSG {args}"
-        elif self.type in (MsgType.NOTICE, MsgType.CTCPREPLY):
-            s = f"NOTICE {args}"
-        elif self.type is MsgType.NUMERIC:
-            s = f"{self.command} {args}"
-        elif self.type is MsgType.SERVERCMD:
-            if args:
-                s = f"{self.command} {args}"
-            else:
-                s = self.command
-        elif self.type is MsgType.CLIENTCMD:
-            s = f":{self.sender} {self.command} {args}"
-
-        return s
-
-    # FIXME
     def __bytes__(self):
-        s = bytearray()
-
-        if self.type in (MsgType.ACTION, MsgType.CTCP, MsgType.CTCPREPLY):
-            if self.type is MsgType.ACTION:
-                ctcpname = "ACTION"
-            else:
-                ctcpname = self.ctcpname
-
-            if len(self.args) > 1:
-                ctcpbody = _ctcp(ctcpname, " ".join(self.args[1:]))
+        return bytes(self.encode_into(bytearray()))
+
+    def encode_into(self, buf):
+        # Appends the wire form of the message, CRLF excluded, to buf
+        msgtype = self.type
+        args = self.args
+
+        if msgtype is MsgType.CLIENTCMD:
+            buf += b":"
+            buf += self.sender.encode()
+            buf += b" "
+
+        if msgtype in PRIVMSG_TYPES:
+            buf += b"PRIVMSG"
+        elif msgtype in NOTICE_TYPES:
+            buf += b"NOTICE"
+        else:
+            buf += self.command.encode()
+
+        if msgtype in CTCP_TYPES:
+            ctcpname = "ACTION" if msgtype is MsgType.ACTION else self.ctcpname
+            buf += b" "
+            _put(buf, args[0])
+            buf += b" :\x01"
+            buf += ctcpname.encode()
+            for arg in args[1:]:
+                buf += b" "
+                _put(buf, arg)
+
+            buf += b"\x01"
+            return buf
+
+        last = len(args) - 1
+        always = msgtype in PRIVMSG_TYPES or msgtype in NOTICE_TYPES
+        for idx, arg in enumerate(args):
+            buf += b" "
+            if idx == last:
+                _put_trailing(buf, arg, always)
             else:
-                ctcpbody = _ctcp(ctcpname)
+                _put_middle(buf, arg)
 
-            args = [self.args[0].encode(), ctcpbody.encode()]
-        else:
-            args = self.args
-
-        args = _join_args_bytes(args)
-
-        if self.type in (MsgType.REGULAR, MsgType.ACTION, MsgType.CTCP):
-            s.extend(b"PRIVMSG ")
-            s.extend(args)
-        elif self.type in (MsgType.NOTICE, MsgType.CTCPREPLY):
-            s.extend(b"NOTICE ")
-            s.extend(args)
-        elif self.type is MsgType.NUMERIC:
-            s.extend(self.command.encode())
-            s.extend(args)
-        elif self.type is MsgType.SERVERCMD:
-            s.extend(self.command)
-            if args:
-                s.extend(args)
-        elif self.type is MsgType.CLIENTCMD:
-            s = f":{self.sender} {self.command} {args}"
-
-        return bytes(s)
+        return buf
@@ -53,4 +53,8 @@ def andify(L):
 
 
 async def send(network, msg):
-    await network._driver.wsendq.send(msg)
+    await network._driver.send(msg)
+
+
+def send_nowait(network, msg):
+    network._driver.send_nowait(msg)
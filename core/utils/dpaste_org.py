@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
-import urllib.request, urllib.parse, urllib.error
-import time
+import http.client
+import urllib.parse
+
+import trio
 
 from .singleton import Singleton
 
@@ -14,6 +16,11 @@ NEVER = "never"
 EXPIRY_TIMES = {ONETIME, ONE_HOUR, ONE_WEEK, ONE_MONTH, NEVER}
 PASTEBIN_API = "https://dpaste.org/api/"
 DEFAULT_EXPIRY = ONE_HOUR
+# Seconds between two pastes
+GRACE_TIME = 4
+# Pastes allowed to wait for their turn, more are refused
+MAX_PENDING = 4
+TIMEOUT = 10
 
 
 class YouShallNotPaste(Exception):
@@ -22,34 +29,80 @@ class YouShallNotPaste(Exception):
 
 class PasteBin(metaclass=Singleton):
 
-    def __init__(self):
-        self._lastpaste = 0
+    def __init__(self, api=PASTEBIN_API):
+        url = urllib.parse.urlsplit(api)
+        self._https = url.scheme == "https"
+        self._host = url.netloc
+        self._path = url.path or "/"
+        # Trio clock time of the last paste
+        self._lastpaste = None
+        self._pending = 0
+        self._lock = trio.Lock()
+        # Kept open between pastes, taken out while a request uses it
+        self._conn = None
 
-    def paste(self, text, title="", format="text", expiry=DEFAULT_EXPIRY):
-        gracetime = time.monotonic() - self._lastpaste
-        if gracetime < 4:
-            time.sleep(4 - gracetime)
+    async def paste(self, text, title="", format="text", expiry=DEFAULT_EXPIRY):
+        if self._pending >= MAX_PENDING:
+            raise YouShallNotPaste("Too many pastes waiting")
 
         if expiry not in EXPIRY_TIMES:
             expiry = DEFAULT_EXPIRY
 
-        req = urllib.request.Request(
-            PASTEBIN_API,
-            data=urllib.parse.urlencode({
-                "format": "url",
-                "expires": expiry,
-                "content": text
-            }).encode()
-        )
-        req.add_header("User-Agent", "curl/7.72.0")
+        body = urllib.parse.urlencode({
+            "format": "url",
+            "expires": expiry,
+            "content": text
+        }).encode()
 
+        self._pending += 1
         try:
-            res = urllib.request.urlopen(req)
-        except urllib.error.HTTPError as e:
-            raise YouShallNotPaste(str(e))
+            async with self._lock:
+                if self._lastpaste is not None:
+                    await trio.sleep_until(self._lastpaste + GRACE_TIME)
+
+                url = await trio.to_thread.run_sync(self._post, body, cancellable=True)
+                self._lastpaste = trio.current_time()
+                return url
+        finally:
+            self._pending -= 1
+
+    def _connect(self):
+        if self._https:
+            return http.client.HTTPSConnection(self._host, timeout=TIMEOUT)
         else:
-            if res.code == 200:
-                self._lastpaste = time.monotonic()
-                return res.read().decode().strip()
+            return http.client.HTTPConnection(self._host, timeout=TIMEOUT)
+
+    def _post(self, body):
+        # Runs in a worker thread
+        headers = {
+            "User-Agent": "curl/7.72.0",
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+        conn, self._conn = self._conn, None
+        # A kept-alive connection may have been closed by the server
+        attempts = 2 if conn is not None else 1
+        for attempt in range(attempts):
+            if conn is None:
+                conn = self._connect()
+
+            try:
+                conn.request("POST", self._path, body, headers)
+                res = conn.getresponse()
+                data = res.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                conn = None
+                if attempt == attempts - 1:
+                    raise YouShallNotPaste(str(e))
             else:
-                raise YouShallNotPaste("HTTP Error {}".format(res.code))
+                break
+
+        if res.will_close:
+            conn.close()
+        else:
+            self._conn = conn
+
+        if res.status == 200:
+            return data.decode().strip()
+        else:
+            raise YouShallNotPaste("HTTP Error {}".format(res.status))
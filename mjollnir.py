@@ -1,6 +1,5 @@
 import locale
 import logging
-import math
 import random
 from functools import partial
 
@@ -8,7 +7,7 @@ import trio
 
 from .core.bookkeeping.bookkeeping import Bookkeeper
 from .core.irclib import commands
-from .core.mixins import MessagePump, Network, IRCMsg
+from .core.mixins import MessagePump, Network, IRCMsg, SINK_DROP
 from .core.drivers import trio_driver
 from .core.enums import MsgType
 from .plugins import dispatcher
@@ -37,11 +36,13 @@ def console_reader(wsendq):
 
 async def console_print(identity, msg):
     network = identity["network"]
-    recipient, *args = msg.args
-    text = vt100.colorize(msg.args[-1])
+    # QUIT and AWAY may come with no arguments at all
+    recipient, *args = msg.args or [None]
+    last = msg.args[-1] if msg.args else ""
+    text = vt100.colorize(last)
 
     if msg.command == "001":
-        log.info(f"@{network} {msg.args[-1]}")
+        log.info(f"@{network} {last}")
     elif msg.command == "372":
         log.info(f"@{network} [MOTD] {text}")
     elif msg.command == "NOTICE":
@@ -73,7 +74,7 @@ async def console_print(identity, msg):
         else:
             log.info(f"@{network} {msg.nick} left {channel}" + f" ({reason})" if reason else "")
     elif msg.command == "QUIT":
-        log.info(f"@{network} {msg.nick} has quit IRC ({msg.args[-1]})")
+        log.info(f"@{network} {msg.nick} has quit IRC ({last})")
     elif msg.command == "MODE":
         if msg.nick == recipient:
             pfx = msg.nick
@@ -88,6 +89,7 @@ async def console_print(identity, msg):
 class Mjollnir:
     def __init__(self):
         self.networks = {}
+        self.pluginmanagers = []
         self.nursery = None
 
     def add_network(self, identity):
@@ -95,7 +97,9 @@ class Mjollnir:
         if name in self.networks:
             raise Exception("Network already present")
 
-        wsendq, rsendq = trio.open_memory_channel(math.inf)
+        # Unbuffered: the backlog waits in the driver's FloodControl, which
+        # holds at most sendq_size lines, so queue_full sees all of it
+        wsendq, rsendq = trio.open_memory_channel(0)
         driver = trio_driver.Driver(identity, rsendq, wsendq)
         self.networks[name] = Network(identity, driver)
 
@@ -110,14 +114,22 @@ class Mjollnir:
     def spawn_network(self, network):
         bookkeeper = Bookkeeper(network)
         pluginmanager = dispatcher.Plugins(network)
+        self.pluginmanagers.append(pluginmanager)
         messagepump = MessagePump()
-        messagepump.attach_source(network._driver.receive)
-        messagepump.add_sink(bookkeeper.manage, [MsgType.ALL])
-        messagepump.add_sink(pluginmanager.dispatch, [MsgType.ALL])
+        messagepump.attach_source(network._driver.receive,
+            batched=network._driver.batched)
+        messagepump.add_batch_sink(bookkeeper.manage_batch, [MsgType.ALL],
+            commands=bookkeeper.commands)
+        concurrency = network.identity.get("plugin_concurrency", dispatcher.CONCURRENCY)
+        # Plugins shed load instead of holding up the bookkeeper behind them
+        messagepump.add_sink(pluginmanager.dispatch, [MsgType.ALL],
+            concurrency=concurrency, key=pluginmanager.lane, overflow=SINK_DROP)
         messagepump.add_sink(partial(console_print, network.identity), [MsgType.ALL])
         self.nursery.start_soon(network._driver.spool)
         self.nursery.start_soon(self._connect, network)
         self.nursery.start_soon(messagepump.run)
+        if network.identity.get("who_sync", True):
+            self.nursery.start_soon(bookkeeper.whosync.run)
         if network.name == "Azzurra":
             run_sync = partial(trio.to_thread.run_sync, cancellable=True)
             self.nursery.start_soon(run_sync, console_reader, network._driver.wsendq)
@@ -131,6 +143,10 @@ class Mjollnir:
             for network in self.networks.values():
                 await self._disconnect(network, "KeyboardInterrupt")
         finally:
+            for pluginmanager in self.pluginmanagers:
+                pluginmanager.close()
+
+            self.pluginmanagers = []
             self.nursery = None
 
 
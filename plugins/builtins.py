@@ -69,7 +69,7 @@ class Builtins:
             mores_cnt = len(mores)
             if mores_cnt > 0:
                 more = mores.pop()
-                text = more.text.decode()
+                text = bytes(more.text).decode()
                 cnt = mores_cnt - 1
                 if cnt > 0:
                     text += utils.morefmt(cnt)
@@ -108,8 +108,8 @@ class Builtins:
             modes = f"+{''.join(channel.modes.keys())}"
             args = f"{' '.join(val for val in channel.modes.values() if val)}"
             irc.reply(f"{channel}: users: {len(channel.nicks)}, modes: {modes} {args}")
-            if channel.topic["text"]:
-                irc.reply(f"setby:{channel.topic['setby']}, timestamp:{channel.topic['timestamp']}, topic:'{channel.topic['text']}'")
+            if channel.topic.text:
+                irc.reply(f"setby:{channel.topic.setby}, timestamp:{channel.topic.timestamp}, topic:'{channel.topic.text}'")
 
     def _on_ctcp(self, irc, msg, text):
         reply = None
@@ -163,3 +163,9 @@ class Builtins:
         self._not_online(irc, msg, text)
 
 # Builtins.calc.tags = dict(threaded=True)
+Builtins.cap.tags = dict(pure=True)
+Builtins.echo.tags = dict(pure=True)
+Builtins.reverse.tags = dict(pure=True)
+Builtins.unireverse.tags = dict(pure=True)
+Builtins.len.tags = dict(pure=True)
+Builtins.unilen.tags = dict(pure=True)
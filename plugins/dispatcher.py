@@ -1,20 +1,26 @@
+import importlib
 import inspect
 import string
 import logging
+import sys
 from random import randint
 
 import trio
 
 from ..core import utils
 from ..core.irclib import commands
-from ..core.irclib.context import IRCContext
+from ..core.irclib.context import ContextPool
+from ..core.drivers.trio_driver import OVERFLOW_MORE
 from ..core.enums import MsgType
 from ..core.mixins import IRCMsg, Nick
 from .builtins import Builtins
-from .nested import NestedScanner
+from .executors import Executors
+from .nested import NestedScanner, NestedEvaluator
 from .spooler import Spooler
 
 BOTCMD_PREFIX = ")"
+# Plugin invocations allowed to run at once per channel
+CONCURRENCY = 4
 VALID_CMDCHARS = string.ascii_letters + string.digits + "_"
 
 log = logging.getLogger("mjollnir")
@@ -27,104 +33,202 @@ def validate_command(cmd):
     return "".join(c for c in cmd if c in VALID_CMDCHARS)
 
 
-async def _spawn_sync(f, ctx, msg, args):
-    if hasattr(f, "tags") and f.tags.get("threaded"):
+class Handler:
+    def __init__(self, f):
+        self.f = f
+        self.tags = getattr(f, "tags", {})
+        self.coroutine = inspect.iscoroutinefunction(f)
+
+
+def build_table(inst):
+    return {name: Handler(method)
+        for name, method in inspect.getmembers(inst, inspect.ismethod)}
+
+
+def event_method(msg):
+    msgtype = msg.type
+    if msgtype is MsgType.CTCP:
+        return "_on_ctcp"
+    elif msgtype is MsgType.CTCPREPLY:
+        return "_on_ctcpreply"
+    elif msgtype is MsgType.ACTION:
+        return "_on_action"
+    else:
+        return f"_on_{msg.command.lower()}"
+
+
+async def _spawn_sync(executors, handler, ctx, msg, args):
+    if handler.tags.get("process"):
+        log.debug("_spawn_sync process")
+        await executors.process(handler.f, ctx, msg, args)
+    elif handler.tags.get("threaded"):
         log.debug("_spawn_sync threaded")
-        await trio.to_thread.run_sync(f, ctx, msg, args)
+        await executors.threaded(handler.f, ctx, msg, args)
     else:
         log.debug("_spawn_sync non-threaded")
-        f(ctx, msg, args)
+        handler.f(ctx, msg, args)
 
 
-async def _spawn_async(f, ctx, msg, args):
-    if hasattr(f, "tags") and f.tags.get("threaded"):
+async def _spawn_async(handler, ctx, msg, args):
+    if handler.tags.get("threaded") or handler.tags.get("process"):
         raise RuntimeError("You must not use async and threaded together.")
     else:
         log.debug("_spawn_async")
-        await f(ctx, msg, args)
+        await handler.f(ctx, msg, args)
 
 
-async def _spawn(ctx, methods, msg, cmd, args):
-    f = methods.get(cmd)
-    if f:
-        if inspect.iscoroutinefunction(f):
-            await _spawn_async(f, ctx, msg, args)
-        else:
-            await _spawn_sync(f, ctx, msg, args)
+async def _spawn(executors, ctx, table, msg, cmd, args):
+    handler = table.get(cmd)
+    if handler is None:
+        return False
+
+    if handler.coroutine:
+        await _spawn_async(handler, ctx, msg, args)
+    else:
+        await _spawn_sync(executors, handler, ctx, msg, args)
+
+    return True
 
 
 class Plugins:
     def __init__(self, network):
         self.network = network
-        self.pluginlist = {"Builtins": Builtins(network)}
-        self.ctx = IRCContext(network)
+        self.pluginlist = {}
+        # Plugin name -> method name -> Handler, built once per (re)load
+        self.tables = {}
+        # Which plugins can possibly act on a message, see _reindex
+        self.events = {}
+        self.commanders = set()
+        self.catchers = set()
+        self.contexts = ContextPool(network)
+        self.executors = Executors(network.identity.get("executor_limits"))
         self.nested = NestedScanner()
-        self.spooler = Spooler(self.ctx, chunksize=512, targmax=network.targmax,
-            maxmodes=network.maxmodes)
+        self.load(Builtins)
 
     def load(self, plugin):
-        pass
-
-    def unload(self, plugin):
-        pass
-
-    def reload(self, plugin):
-        pass
+        name = plugin.__name__
+        if name in self.pluginlist:
+            raise ValueError(f"Plugin {name} is already loaded")
+
+        inst = plugin(self.network)
+        self.pluginlist[name] = inst
+        self.tables[name] = build_table(inst)
+        self._reindex()
+
+    def unload(self, name):
+        self.pluginlist.pop(name)
+        self.tables.pop(name)
+        self._reindex()
+
+    def reload(self, name):
+        module = importlib.reload(sys.modules[type(self.pluginlist[name]).__module__])
+        self.unload(name)
+        self.load(getattr(module, name))
+
+    def close(self):
+        self.executors.close()
+
+    def lane(self, msg):
+        # Messages to the same channel are processed in order
+        chantypes = self.network.capabilities.get("CHANTYPES", "#&")
+        if msg.recipient and utils.ischannel(msg.recipient, chantypes):
+            return self.network.casemapping.fold(msg.recipient)
+
+    def _reindex(self):
+        self.events = {}
+        self.commanders = set()
+        self.catchers = set()
+        for name, table in self.tables.items():
+            for method in table:
+                if method.startswith("_on_"):
+                    self.events.setdefault(method, set()).add(name)
+                elif method in ("_uncatched", "_catchall"):
+                    self.catchers.add(name)
+                elif not method.startswith("_"):
+                    self.commanders.add(name)
+
+    def _route(self, msg, method):
+        names = self.catchers | self.events.get(method, set())
+        if msg.type is MsgType.REGULAR and msg.text.startswith(BOTCMD_PREFIX):
+            names = names | self.commanders
+
+        return [table for name, table in self.tables.items() if name in names]
 
     async def dispatch(self, msg):
-        self.ctx.set_message(msg)
+        method = event_method(msg)
+        tables = self._route(msg, method)
+        if not tables:
+            return
+
+        ctx = self.contexts.acquire(msg)
+        try:
+            await self._invoke(ctx, msg, tables, method)
+        finally:
+            self.contexts.release(ctx)
 
+    async def _invoke(self, ctx, msg, tables, method):
         with trio.move_on_after(15):
             async with trio.open_nursery() as nursery:
-                for name, inst in self.pluginlist.items():
-                    nursery.start_soon(self._dispatch, inst, msg)
-
-        for message in self.spooler.spool():
+                for table in tables:
+                    nursery.start_soon(self._dispatch, ctx, table, msg, method)
+
+        spooler = Spooler(ctx, chunksize=512, targmax=self.network.targmax,
+            maxmodes=self.network.maxmodes)
+        driver = self.network._driver
+        more = driver.overflow == OVERFLOW_MORE
+        # Held back by one, the last line sent gets the (N more) suffix
+        held = None
+        deferred = []
+        async for message in spooler.spool():
             log.debug(message)
-            await utils.send(self.network, message)
+            if (more and message.encoded and held is not None
+                    and (deferred or driver.queue_full)):
+                deferred.append(message)
+            elif deferred:
+                await utils.send(self.network, message)
+            else:
+                if held is not None:
+                    await utils.send(self.network, held)
+
+                held = message
+
+        if deferred:
+            log.debug(f"dispatcher.dispatch Send queue full, deferring {len(deferred)} messages")
+            held = spooler.defer(held, deferred)
 
-        self.ctx.reset_responses()
+        if held is not None:
+            await utils.send(self.network, held)
 
-    async def _dispatch(self, inst, msg):
+    async def _dispatch(self, ctx, table, msg, method):
         try:
-            await self._dispatch_event(inst, msg)
+            await self._dispatch_event(ctx, table, msg, method)
         except Exception as e:
-            err = commands.msg(self.ctx.to(msg), f"Error: {str(e)}")
+            err = commands.msg(ctx.to(msg), f"Error: {str(e)}")
             await utils.send(self.network, err)
 
-    async def _dispatch_event(self, inst, msg):
+    async def _dispatch_event(self, ctx, table, msg, method):
         msgtype = msg.type
         text = msg.text
         dispatched = False
-        methods = {name: method for name, method in inspect.getmembers(inst, inspect.ismethod)}
 
         if msgtype is MsgType.REGULAR and text.startswith(BOTCMD_PREFIX):
             nested_pfx = BOTCMD_PREFIX * 2
             if text.startswith(nested_pfx):
-                dispatched = await self._execute_nested(methods, msg, text[len(nested_pfx):])
+                dispatched = await self._execute_nested(ctx, table, msg, text[len(nested_pfx):])
             else:
-                dispatched = await self._execute_command(methods, msg, text[len(BOTCMD_PREFIX):])
-
-        if msgtype is MsgType.CTCP:
-            method = "_on_ctcp"
-        elif msgtype is MsgType.CTCPREPLY:
-            method = f"_on_ctcpreply"
-        elif msgtype is MsgType.ACTION:
-            method = f"_on_action"
-        else:
-            method = f"_on_{msg.command.lower()}"
+                dispatched = await self._execute_command(ctx, table, msg, text[len(BOTCMD_PREFIX):])
 
         dispatched = any([
             dispatched,
-            await _spawn(self.ctx, methods, msg, method, text)
+            await _spawn(self.executors, ctx, table, msg, method, text)
         ])
 
         if not dispatched:
-            await _spawn(self.ctx, methods, msg, "_uncatched", text)
+            await _spawn(self.executors, ctx, table, msg, "_uncatched", text)
 
-        await _spawn(self.ctx, methods, msg, "_catchall", text)
+        await _spawn(self.executors, ctx, table, msg, "_catchall", text)
 
-    async def _execute_command(self, methods, msg, text):
+    def _parse_command(self, text):
         cmd = text.split(" ", 1)
 
         if len(cmd) > 1:
@@ -134,40 +238,40 @@ class Plugins:
 
         cmd = validate_command(cmd)
         if cmd is False:
-            return False
+            return None, args
 
-        return await _spawn(self.ctx, methods, msg, cmd.lower(), args)
+        return cmd.lower(), args
 
-    async def _execute_nested(self, methods, msg, text):
-        try:
-            cmds = self.nested.scan(text)
-        except ValueError as e:
-            self.ctx.msg(self.ctx.to(msg), f"Error: {str(e)}")
-        else:
-            ret =  await self._evaluate(methods, msg, cmds)
-            return True if ret else False
+    async def _execute_command(self, ctx, table, msg, text):
+        cmd, args = self._parse_command(text)
+        if cmd is None:
+            return False
 
-    def _expand(self, cmds):
-        longest = max((len(cmd) if isinstance(cmd, list) else 1) for cmd in cmds)
-        out = [[] for _ in range(longest)]
+        return await _spawn(self.executors, ctx, table, msg, cmd, args)
 
-        for cmd in cmds:
-            if isinstance(cmd, list):
-                for idx, token in enumerate(cmd):
-                    out[idx].append(token)
-            else:
-                for idx in range(longest):
-                    out[idx].append(cmd)
+    async def _execute_nested(self, ctx, table, msg, text):
+        borrowed = []
 
-        return out
+        def new_context():
+            borrowed.append(self.contexts.acquire(msg))
+            return borrowed[-1]
 
-    async def _evaluate(self, methods, msg, cmds):
-        for idx, cmd in enumerate(cmds):
-            if isinstance(cmd, list):
-                cmds[idx] = await self._evaluate(methods, msg, cmd)
-                self.ctx.reset_responses()
+        async def execute(subctx, line):
+            await self._execute_command(subctx, table, msg, line)
 
-        for cmd in self._expand(cmds):
-            await self._execute_command(methods, msg, "".join(cmd))
+        def is_pure(line):
+            cmd, _ = self._parse_command(line)
+            handler = table.get(cmd)
+            return handler is not None and handler.tags.get("pure", False)
 
-        return [msg.text for msg in self.ctx.responses if msg.text]
+        evaluator = NestedEvaluator(execute, new_context, is_pure)
+        try:
+            cmds = self.nested.scan(text)
+            ret = await evaluator.evaluate(cmds, ctx)
+        except ValueError as e:
+            ctx.msg(ctx.to(msg), f"Error: {str(e)}")
+        else:
+            return True if ret else False
+        finally:
+            for subctx in borrowed:
+                self.contexts.release(subctx)
@@ -0,0 +1,142 @@
+import logging
+import multiprocessing
+
+import trio
+
+# Commands of each executor tag allowed to run at once
+LIMITS = {"threaded": 4, "process": 2}
+# Longest a worker thread waits on a worker process before giving up
+RESULT_TIMEOUT = 60
+# Workers start from a fresh interpreter, forking would copy the threads
+# and locks of a running bot
+START_METHOD = "spawn"
+
+log = logging.getLogger("mjollnir")
+
+
+def _call_detached(func, plugin, ctx, msg, args):
+    func(plugin, ctx, msg, args)
+    return ctx.responses
+
+
+def _detach(inst, network):
+    # Picklable copy of a plugin instance, backed by the network snapshot
+    plugin = object.__new__(type(inst))
+    plugin.__dict__.update(inst.__dict__)
+    plugin.network = network
+    return plugin
+
+
+def _serve(conn):
+    # Worker process main loop, one job at a time until the pipe closes
+    while True:
+        try:
+            f, args = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            result = (True, f(*args))
+        except Exception as e:
+            result = (False, f"{type(e).__name__}: {e}")
+
+        conn.send(result)
+
+
+class Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def call(self, f, args):
+        # Runs in a trio worker thread
+        self.conn.send((f, args))
+        if not self.conn.poll(RESULT_TIMEOUT):
+            raise TimeoutError(f"No result after {RESULT_TIMEOUT} seconds")
+
+        ok, result = self.conn.recv()
+        if not ok:
+            raise RuntimeError(result)
+
+        return result
+
+    def close(self):
+        self.conn.close()
+        self.process.join()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ProcessPool:
+    def __init__(self, size):
+        self.size = size
+        self.context = multiprocessing.get_context(START_METHOD)
+        # Warm workers waiting for a job, each one runs a single job at a time
+        self._idle = []
+
+    async def run(self, f, *args):
+        if self._idle:
+            worker = self._idle.pop()
+        else:
+            worker = await trio.to_thread.run_sync(Worker, self.context)
+
+        try:
+            result = await trio.to_thread.run_sync(worker.call, f, args,
+                cancellable=True)
+        except (trio.Cancelled, TimeoutError, EOFError, OSError):
+            # Cancelled, timed out or broken: it's the only job in there
+            log.info("executors.ProcessPool Killing the worker of a failed job")
+            with trio.CancelScope(shield=True):
+                await trio.to_thread.run_sync(worker.kill)
+
+            raise
+        except BaseException:
+            # The job raised in there, the worker is ready for another one
+            self._release(worker)
+            raise
+
+        self._release(worker)
+        return result
+
+    def _release(self, worker):
+        if len(self._idle) < self.size:
+            self._idle.append(worker)
+        else:
+            worker.close()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+
+class Executors:
+    def __init__(self, limits=None):
+        limits = {**LIMITS, **(limits or {})}
+        self.limiters = {tag: trio.CapacityLimiter(size) for tag, size in limits.items()}
+        self.processes = ProcessPool(limits["process"])
+
+    async def threaded(self, f, ctx, msg, args):
+        try:
+            await trio.to_thread.run_sync(f, ctx, msg, args, cancellable=True,
+                limiter=self.limiters["threaded"])
+        except trio.Cancelled:
+            # The thread can't be stopped and keeps using ctx
+            ctx.abandoned = True
+            raise
+
+    async def process(self, f, ctx, msg, args):
+        detached = ctx.detached()
+        plugin = _detach(f.__self__, detached.network)
+        async with self.limiters["process"]:
+            responses = await self.processes.run(_call_detached, f.__func__,
+                plugin, detached, msg, args)
+
+        ctx.responses.extend(responses)
+
+    def close(self):
+        self.processes.close()
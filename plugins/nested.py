@@ -1,77 +1,207 @@
+import re
+
+import trio
+
+MAX_DEPTH = 4
+MAX_FANOUT = 8
+MAX_EXPANSION = 16
+MAX_EXPANSION_LENGTH = 4096
+# Longest expression the scanner accepts
+MAX_SCAN_LENGTH = 1024
+
+
+def expand(cmds):
+    longest = max((len(cmd) if isinstance(cmd, list) else 1) for cmd in cmds)
+    out = [[] for _ in range(longest)]
+
+    for cmd in cmds:
+        if isinstance(cmd, list):
+            for idx, token in enumerate(cmd):
+                out[idx].append(token)
+        else:
+            for idx in range(longest):
+                out[idx].append(cmd)
+
+    return out
+
 
 class NestedScanner:
-    def __init__(self, opening="{", closing="}", escapechar="\\"):
+    def __init__(self, opening="{", closing="}", escapechar="\\", *,
+        maxlength=MAX_SCAN_LENGTH, maxdepth=MAX_DEPTH):
         self.opening = opening
         self.closing = closing
         self.escapechar = escapechar
+        self.maxlength = maxlength
+        self.maxdepth = maxdepth
+        braces = re.escape(opening + closing)
+        escapable = re.escape(opening + closing + escapechar)
+        # Either an escaped special character or a bare brace
+        self.token_re = re.compile(f"{re.escape(escapechar)}([{escapable}])|([{braces}])")
 
     def scan(self, text):
-        self.reset()
-        self.string = text
-        self.total = len(text)
-        while self.current < self.total:
-            c = self.string[self.current]
-            if c == self.escapechar:
-                if self.peek() in (self.opening, self.closing, self.escapechar):
-                    self.string = self.string[:self.current] + self.string[self.current + 1:]
-                    self.total -= 1
-            elif c == self.opening:
-                self._found_opening()
-                self.start = self.current + 1
-            elif c == self.closing:
-                self._found_closing()
-                self.start = self.current + 1
-
-            self.current += 1
-
-        if self.depth > 0:
-            raise ValueError(f"Missing {self.depth} closing '{self.closing}'")
-        elif self.missing_opening:
-            raise ValueError(f"Missing {-self.missing_opening} opening '{self.opening}'")
-
-        if self.current_token:
-            self.tree.append(self.current_token)
-
-        return self.tree
-
-    def peek(self):
-        return self.string[self.current + 1] if self.current + 1 < self.total else ''
-
-    def reset(self):
-        self.tree = []
-        self.frame = self.tree
-        self.start = 0
-        self.current = 0
-        self.total = 0
-        self.missing_opening = 0
-        self.depth = 0
-
-    @property
-    def current_token(self):
-        return self.string[self.start:self.current]
-
-    def _found_opening(self):
-        token = self.current_token
-        if token:
-            self.frame.append(token)
+        if len(text) > self.maxlength:
+            raise ValueError(f"Expression longer than {self.maxlength} characters")
+
+        tree = []
+        frame = tree
+        stack = []
+        # Pieces of the current token, escapes already removed
+        parts = []
+        depth = 0
+        lowest = 0
+        opening = self.opening
+        # Text, escaped character, brace, text, ..., text: one of each pair
+        # is None
+        pieces = self.token_re.split(text)
 
-        if self.depth > 0:
-            self.tree.append(self.frame)
+        for idx in range(1, len(pieces), 3):
+            escaped = pieces[idx]
+            if escaped is not None:
+                parts.append(pieces[idx - 1])
+                parts.append(escaped)
+                continue
 
-        newf = []
-        self.frame.append(newf)
-        self.frame = newf
-        self.depth += 1
+            if parts:
+                parts.append(pieces[idx - 1])
+                token = "".join(parts)
+                parts.clear()
+            else:
+                token = pieces[idx - 1]
 
-    def _found_closing(self):
-        token = self.current_token
+            if token:
+                frame.append(token)
+
+            if pieces[idx + 1] == opening:
+                if depth >= 0:
+                    if depth == self.maxdepth:
+                        raise ValueError(f"Nesting deeper than {self.maxdepth} levels")
+
+                    newf = []
+                    frame.append(newf)
+                    stack.append(frame)
+                    frame = newf
+
+                depth += 1
+            else:
+                depth -= 1
+                if depth >= 0:
+                    frame = stack.pop()
+                elif depth < lowest:
+                    lowest = depth
+
+        if depth > 0:
+            raise ValueError(f"Missing {depth} closing '{self.closing}'")
+        elif lowest:
+            raise ValueError(f"Missing {-lowest} opening '{self.opening}'")
+
+        parts.append(pieces[-1])
+        token = "".join(parts)
         if token:
-            self.frame.append(token)
-
-        self.depth -= 1
-        if self.depth > 0:
-            self.frame = self.tree.pop()
-        elif self.depth == 0:
-            self.frame = self.tree
-        elif self.depth < self.missing_opening:
-            self.missing_opening = self.depth
+            tree.append(token)
+
+        return tree
+
+
+class NestedEvaluator:
+    def __init__(self, execute, new_context, is_pure, *, maxdepth=MAX_DEPTH,
+        maxfanout=MAX_FANOUT, maxexpansion=MAX_EXPANSION, maxlength=MAX_EXPANSION_LENGTH):
+        # execute(ctx, text) runs a single command line against ctx
+        self.execute = execute
+        self.new_context = new_context
+        self.is_pure = is_pure
+        self.maxdepth = maxdepth
+        self.maxfanout = maxfanout
+        self.maxexpansion = maxexpansion
+        self.maxlength = maxlength
+        # Command line -> (done event, responses), only for pure commands
+        self.memo = {}
+        # Running totals of the evaluate() call, the limits cap all levels
+        self.rows = 0
+        self.length = 0
+        self.error = None
+
+    async def evaluate(self, cmds, ctx):
+        self.rows = 0
+        self.length = 0
+        self.error = None
+        return await self._evaluate(cmds, ctx, 0)
+
+    async def _evaluate(self, cmds, ctx, depth):
+        if depth > self.maxdepth:
+            raise ValueError(f"Nesting deeper than {self.maxdepth} levels")
+
+        if len(cmds) > self.maxfanout:
+            raise ValueError(f"More than {self.maxfanout} expressions on one level")
+
+        # Sibling subexpressions don't depend on each other
+        cmds = list(cmds)
+        async with trio.open_nursery() as nursery:
+            for idx, cmd in enumerate(cmds):
+                if isinstance(cmd, list):
+                    nursery.start_soon(self._evaluate_child, nursery, cmds, idx, depth)
+
+        # The first error of any sibling, as itself rather than a MultiError
+        if self.error is not None:
+            raise self.error
+
+        rows = expand(cmds) if cmds else []
+        self.rows += len(rows)
+        if self.rows > self.maxexpansion:
+            raise ValueError(f"Expands to more than {self.maxexpansion} commands")
+
+        lines = ["".join(row) for row in rows]
+        self.length += sum(len(line) for line in lines)
+        if self.length > self.maxlength:
+            raise ValueError(f"Expands to more than {self.maxlength} characters")
+
+        results = [None] * len(lines)
+        async with trio.open_nursery() as nursery:
+            for idx, line in enumerate(lines):
+                nursery.start_soon(self._run, nursery, results, idx, line)
+
+        if self.error is not None:
+            raise self.error
+
+        for responses in results:
+            ctx.responses.extend(responses)
+
+        return [msg.text for msg in ctx.responses if msg.text]
+
+    async def _evaluate_child(self, nursery, cmds, idx, depth):
+        try:
+            cmds[idx] = await self._evaluate(cmds[idx], self.new_context(), depth + 1)
+        except Exception as e:
+            self._fail(nursery, e)
+
+    def _fail(self, nursery, e):
+        if self.error is None:
+            self.error = e
+
+        nursery.cancel_scope.cancel()
+
+    async def _run(self, nursery, results, idx, line):
+        try:
+            await self._run_line(results, idx, line)
+        except Exception as e:
+            self._fail(nursery, e)
+
+    async def _run_line(self, results, idx, line):
+        if not self.is_pure(line):
+            ctx = self.new_context()
+            await self.execute(ctx, line)
+            results[idx] = ctx.responses
+            return
+
+        entry = self.memo.get(line)
+        if entry is None:
+            entry = self.memo[line] = [trio.Event(), []]
+            ctx = self.new_context()
+            try:
+                await self.execute(ctx, line)
+            finally:
+                entry[1] = ctx.responses
+                entry[0].set()
+        else:
+            await entry[0].wait()
+
+        results[idx] = entry[1]
@@ -1,7 +1,7 @@
 from ..core import utils
 from ..core.enums import MsgType
 from ..core.irclib import commands
-from ..core.utils.dpaste_org import PasteBin
+from ..core.utils.dpaste_org import PasteBin, YouShallNotPaste
 from ..core.utils.utf8utils import UTF8Chunker
 from ..core.utils.environment import Env
 
@@ -10,27 +10,28 @@ import logging
 INSTANT_THRESHOLD = 7
 MORE_THRESHOLD = 7
 MAX_MORES = MORE_THRESHOLD - INSTANT_THRESHOLD
+FILTERED_CHARS = str.maketrans("", "", "\x00\r")
 log = logging.getLogger("mjollnir")
 
 
-def pastebin(messages):
-    return PasteBin().paste("\n".join(m.text for m in messages))
+async def pastebin(messages):
+    return await PasteBin().paste("\n".join(m.text for m in messages))
 
 
 def filter_chars(text):
     if text.startswith("\x01"):
         text = text[1:]
 
-    return "".join(c for c in text if c not in "\x00\r")
+    return text.translate(FILTERED_CHARS)
 
 
-def _maxlinelen(msg, chunksize):
+def _overhead(msg):
     unavailable = len(f":{msg.sender} {msg.command} {msg.recipient} \r\n")
     # TODO
     # if msg.args[-1].startswith(":"):
     unavailable += 1
 
-    return chunksize - unavailable
+    return unavailable
 
 
 class Spooler:
@@ -43,8 +44,10 @@ class Spooler:
         self.chunker = UTF8Chunker()
         self.reset()
 
-    def spool(self):
+    async def spool(self):
         self.current_chunksize = self.chunksize
+        # Chunk -> (encoded response, offset, length) it was cut from
+        self.spans = {}
 
         for response in self.ctx.responses:
             self._process(response)
@@ -61,7 +64,7 @@ class Spooler:
         if len(self.mores) > MAX_MORES:
             self.chunked = []
             self.mores = []
-            self._paste()
+            await self._paste()
 
         if self.mores:
             msg = self.ctx.incoming
@@ -77,6 +80,57 @@ class Spooler:
         self.chunked = []
         self.mores = []
 
+    def defer(self, last, messages):
+        # Moves messages to )more, returns what to send in place of last.
+        # They come before any mores of this same response, so they go to
+        # the end of the list, where )more takes from
+        msg = self.ctx.incoming
+        mores = Env().mores[self.ctx.to(msg)]
+        pending = mores[msg.identhost] or []
+        include = last is not None and last.encoded
+        if include:
+            messages = [last] + messages
+
+        # Cut again to leave room for the suffix, it can only add one line
+        # for each run of text
+        suffix_len = len(utils.morefmt(len(pending) + 2 * len(messages)).encode())
+        self.current_chunksize = self.chunksize - suffix_len
+        chunks = []
+        for run in self._runs(messages):
+            chunks.extend(self._chunkify(run))
+
+        if include:
+            last = chunks.pop(0)
+
+        mores[msg.identhost] = pending + chunks[::-1]
+        if include:
+            last += utils.morefmt(len(pending) + len(chunks)).encode()
+
+        return last
+
+    def _runs(self, messages):
+        # Chunks that were contiguous in their response are joined back
+        run = None
+        for message in messages:
+            data, offset, length = self.spans[message]
+            if run is not None and run[1] is data and run[3] == offset:
+                run[3] = offset + length
+                continue
+
+            if run is not None:
+                yield self._joined(*run)
+
+            run = [message, data, offset, offset + length]
+
+        if run is not None:
+            yield self._joined(*run)
+
+    def _joined(self, msg, data, start, end):
+        newmsg = msg.copy()
+        newmsg.encoded = False
+        newmsg.text = bytes(data[start:end]).decode()
+        return newmsg
+
     def _process(self, msg):
         if msg.type in (MsgType.REGULAR, MsgType.NOTICE):
             self._process_textmessage(msg)
@@ -116,34 +170,39 @@ class Spooler:
                 if total == INSTANT_THRESHOLD:
                     suffix_len = len(utils.morefmt(MAX_MORES).encode())
                     self.current_chunksize = self.chunksize - suffix_len
+                    # The response being chunked is cut shorter from now on
+                    self.chunker.chunksize -= suffix_len
 
             if bailout:
                 break
 
-    def _paste(self):
+    async def _paste(self):
         msg = self.ctx.incoming
         responses = self.ctx.responses
-        pasteurl = pastebin(responses)
+        try:
+            pasteurl = await pastebin(responses)
+        except YouShallNotPaste as e:
+            log.info(f"spooler._paste Paste failed: {str(e)}")
+            self.chunked.append(commands.msg(self.ctx.to(msg), f"Error: {str(e)}"))
+            return
+
         length = sum(len(response.text.split("\n")) for response in responses)
         plur = "s" if length != 1 else ""
         s = f"{msg.nick}: look at {pasteurl} ({length} line{plur} long)"
         self.chunked.append(commands.msg(self.ctx.to(msg), s))
 
     def _chunkify(self, msg):
-        text = filter_chars(msg.text)
-
-        for line in text.split("\n"):
-            self.chunker.set_stream(line)
-            while not self.chunker.finished:
-                chunksize = _maxlinelen(msg, self.current_chunksize)
-                chunk = self.chunker.next_chunk(chunksize)
-                if chunk is None:
-                    break
-
-                newmsg = msg.copy()
-                newmsg.encoded = True
-                newmsg.text = chunk
-                yield newmsg
+        # The whole response is encoded once, chunks are views into it
+        self.chunker.set_stream(filter_chars(msg.text))
+        data = memoryview(self.chunker.data)
+        budget = self.current_chunksize - _overhead(msg)
+
+        for offset, length in self.chunker.spans(budget):
+            newmsg = msg.copy()
+            newmsg.encoded = True
+            newmsg.text = data[offset:offset + length]
+            self.spans[newmsg] = (data, offset, length)
+            yield newmsg
 
     @property
     def count(self):
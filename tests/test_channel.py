@@ -0,0 +1,31 @@
+from ..core.mixins import CaseMapping, Channel
+
+
+def test_rfc1459_names_are_equal():
+    casemapping = CaseMapping("rfc1459")
+    channel = Channel("#[A]~", casemapping)
+    assert channel == "#{a}^"
+    assert channel == Channel("#{a}^", casemapping)
+    assert channel != "#[b]"
+    assert channel != 42
+
+
+def test_ascii_keeps_brackets_apart():
+    channel = Channel("#[A]", CaseMapping("ascii"))
+    assert channel == "#[a]"
+    assert channel != "#{a}"
+
+
+def test_casemapping_change_applies():
+    casemapping = CaseMapping("ascii")
+    channel = Channel("#[a]", casemapping)
+    assert channel != "#{a}"
+    casemapping.set("rfc1459")
+    assert channel == "#{a}"
+
+
+def test_hash_is_identity():
+    casemapping = CaseMapping()
+    channel = Channel("#chan", casemapping)
+    assert {channel: 1}[channel] == 1
+    assert Channel("#chan", casemapping) not in {channel: 1}
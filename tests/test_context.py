@@ -0,0 +1,107 @@
+import threading
+
+import trio
+import trio.testing
+
+from ..core.irclib import parser
+from ..core.irclib.context import ContextPool
+from ..core.mixins import Network
+from ..plugins.dispatcher import Plugins
+from ..plugins.executors import Executors
+from .test_executors import FakeNetwork
+
+
+def test_released_contexts_are_reused():
+    pool = ContextPool(FakeNetwork())
+    ctx = pool.acquire(parser.parse(":a!b@c PRIVMSG #chan :hi"))
+    ctx.reply("hello")
+    pool.release(ctx)
+
+    again = pool.acquire(parser.parse(":d!e@f PRIVMSG #other :hi"))
+    assert again is ctx
+    assert again.responses == []
+
+
+def test_abandoned_thread_keeps_its_context():
+    release = threading.Event()
+    finished = threading.Event()
+
+    def stuck(ctx, msg, args):
+        release.wait()
+        ctx.reply("late")
+        finished.set()
+
+    async def main():
+        executors = Executors()
+        pool = ContextPool(FakeNetwork())
+        first = pool.acquire(parser.parse(":a!b@c PRIVMSG #chan :)stuck"))
+        with trio.move_on_after(0.1):
+            await executors.threaded(stuck, first, first.incoming, "")
+
+        pool.release(first)
+        second = pool.acquire(parser.parse(":d!e@f PRIVMSG #other :)ping"))
+        release.set()
+        await trio.to_thread.run_sync(finished.wait)
+        return first, second
+
+    first, second = trio.run(main)
+    assert first.abandoned
+    assert second is not first
+    assert second.responses == []
+    assert [msg.recipient for msg in first.responses] == ["#chan"]
+
+
+class SendingDriver:
+    overflow = "block"
+    queue_full = False
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, msg):
+        self.sent.append((trio.current_time(), msg))
+
+
+class Slow:
+    def __init__(self, network):
+        self.network = network
+        self.running = 0
+        self.most = 0
+
+    async def slow(self, irc, msg, text):
+        self.running += 1
+        self.most = max(self.most, self.running)
+        await trio.sleep(5)
+        # Replies after the others started, to whoever asked
+        irc.reply(f"{text} done")
+        self.running -= 1
+
+
+def test_invocations_in_flight_keep_their_replies():
+    async def main():
+        driver = SendingDriver()
+        network = Network({"network": "Test", "nick": "mjollnir",
+            "ident": "mjollnir"}, driver)
+        network.capabilities["CHANTYPES"] = "#"
+        plugins = Plugins(network)
+        plugins.load(Slow)
+        try:
+            async with trio.open_nursery() as nursery:
+                for n in range(6):
+                    channel = ("#one", "#two")[n % 2]
+                    line = f":nick{n}!u@h PRIVMSG {channel} :)slow job{n}"
+                    nursery.start_soon(plugins.dispatch, parser.parse(line))
+        finally:
+            plugins.close()
+
+        return driver.sent, plugins.pluginlist["Slow"]
+
+    sent, slow = trio.run(main,
+        clock=trio.testing.MockClock(autojump_threshold=0))
+    assert slow.most == 6
+    # All of them ran side by side
+    assert {when for when, _ in sent} == {5}
+    replies = sorted((msg.recipient, bytes(msg.text).decode())
+        for _, msg in sent)
+    assert replies == sorted(
+        (("#one", "#two")[n % 2], f"job{n} done") for n in range(6))
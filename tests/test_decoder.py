@@ -0,0 +1,78 @@
+from ..core.irclib.decoder import Decoder, _sender, utf8_seq_re
+
+
+def privmsg(nick, text):
+    return b":" + nick + b"!u@h PRIVMSG #chan :" + text
+
+
+def test_sender():
+    assert _sender(b":nick!u@h PRIVMSG #chan :hi") == b"nick"
+    assert _sender(b":irc.example 001 nick :hi") == b"irc.example"
+    assert _sender(b"@time=x :nick!u@h PRIVMSG #chan :hi") == b"nick"
+    assert _sender(b"PING :irc") is None
+    assert _sender(b"@time=x") is None
+
+
+def test_ascii():
+    decoder = Decoder()
+    assert decoder.decode(privmsg(b"a", b"hello")) == ":a!u@h PRIVMSG #chan :hello"
+    assert not decoder._fallbacks
+
+
+def test_utf8():
+    decoder = Decoder()
+    line = privmsg(b"a", "caffè ☕".encode())
+    assert decoder.decode(line) == line.decode()
+    assert not decoder._fallbacks
+
+
+def test_latin_sender_is_remembered():
+    decoder = Decoder()
+    assert decoder.decode(privmsg(b"a", "caffè".encode("iso-8859-15"))).endswith(":caffè")
+    assert dict(decoder._fallbacks) == {b"a": "iso-8859-15"}
+    # Straight to the fallback, no UTF-8 attempt
+    assert decoder.decode(privmsg(b"a", "€uro".encode("iso-8859-15"))).endswith(":€uro")
+    # Unless the line looks like UTF-8
+    assert decoder.decode(privmsg(b"a", "più".encode())).endswith(":più")
+    assert dict(decoder._fallbacks) == {b"a": "iso-8859-15"}
+
+
+def test_broken_fallback_is_forgotten():
+    decoder = Decoder(("utf8", "ascii", "iso-8859-15"))
+    decoder._remember(b"a", "ascii")
+    assert decoder.decode(privmsg(b"a", b"\xe8")).endswith(":è")
+    assert dict(decoder._fallbacks) == {b"a": "iso-8859-15"}
+
+
+def test_lru_eviction():
+    decoder = Decoder(cachesize=2)
+    latin = "è".encode("iso-8859-15")
+    decoder.decode(privmsg(b"a", latin))
+    decoder.decode(privmsg(b"b", latin))
+    # Using a refreshes it, b is the oldest now
+    decoder.decode(privmsg(b"a", latin))
+    decoder.decode(privmsg(b"c", latin))
+    assert list(decoder._fallbacks) == [b"a", b"c"]
+
+
+def test_invalid_utf8():
+    decoder = Decoder(("utf8",))
+    assert decoder.decode(privmsg(b"a", b"\xff\xfe ok")).endswith(":�� ok")
+    assert not decoder._fallbacks
+
+
+def test_split_multibyte_sequence():
+    # A line cut in the middle of a UTF-8 sequence
+    text = "caffè".encode()
+    decoder = Decoder()
+    line = privmsg(b"a", text[:-1])
+    assert decoder.decode(line) == line.decode("iso-8859-15")
+    strict = Decoder(("utf8",))
+    assert strict.decode(line).endswith(":caff�")
+
+
+def test_utf8_seq_re():
+    assert utf8_seq_re.search("è".encode())
+    assert utf8_seq_re.search("☕".encode())
+    assert not utf8_seq_re.search("è".encode("iso-8859-15"))
+    assert not utf8_seq_re.search(b"\xc3 ")
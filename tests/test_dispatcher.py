@@ -0,0 +1,194 @@
+import sys
+import textwrap
+
+import pytest
+import trio
+import trio.testing
+
+from ..core import utils
+from ..core.drivers.trio_driver import Driver
+from ..core.irclib import parser
+from ..core.mixins import Network
+from ..core.utils.environment import Env
+from ..plugins.dispatcher import Plugins, event_method
+from .test_context import SendingDriver
+from .test_floodcontrol import FakeStream
+
+
+class Greeter:
+    def __init__(self, network):
+        self.network = network
+
+    def hello(self, irc, msg, text):
+        irc.reply("hello")
+
+    def _on_join(self, irc, msg, text):
+        irc.reply("welcome")
+
+
+class Logger:
+    def __init__(self, network):
+        self.network = network
+        self.seen = []
+
+    def _catchall(self, irc, msg, text):
+        self.seen.append(msg.command)
+
+
+class Talker:
+    text = " ".join(f"word{n}" for n in range(400))
+
+    def __init__(self, network):
+        self.network = network
+
+    def talk(self, irc, msg, text):
+        irc.reply(self.text)
+
+
+def setup():
+    network = Network({"network": "Test", "nick": "mjollnir", "ident": "mjollnir"},
+        SendingDriver())
+    network.capabilities["CHANTYPES"] = "#"
+    return network, Plugins(network)
+
+
+def routed(plugins, line):
+    msg = parser.parse(line)
+    tables = plugins._route(msg, event_method(msg))
+    return {name for name, table in plugins.tables.items() if table in tables}
+
+
+def test_messages_go_only_to_interested_plugins():
+    _, plugins = setup()
+    plugins.load(Greeter)
+    assert routed(plugins, "PING :irc") == set()
+    assert routed(plugins, ":irc 372 mjollnir :- motd") == set()
+    assert routed(plugins, ":a!b@c JOIN #chan") == {"Greeter"}
+    assert routed(plugins, ":a!b@c PRIVMSG #chan :)hello") == {"Builtins", "Greeter"}
+    assert routed(plugins, ":a!b@c PRIVMSG #chan :hello") == set()
+    # The idle builtin waits on WHOIS replies
+    assert routed(plugins, ":irc 317 mjollnir a 10 0 :seconds idle") == {"Builtins"}
+
+    plugins.load(Logger)
+    assert routed(plugins, "PING :irc") == {"Logger"}
+
+
+def test_zero_handler_message_skips_the_nursery():
+    _, plugins = setup()
+    invoked = []
+
+    async def invoke(ctx, msg, tables, method):
+        invoked.append(msg.command)
+
+    plugins._invoke = invoke
+    acquired = []
+    acquire = plugins.contexts.acquire
+
+    def counting_acquire(msg):
+        acquired.append(msg.command)
+        return acquire(msg)
+
+    plugins.contexts.acquire = counting_acquire
+
+    async def main():
+        await plugins.dispatch(parser.parse("PING :irc"))
+        await plugins.dispatch(parser.parse(":irc 372 mjollnir :- motd"))
+        await plugins.dispatch(parser.parse(":a!b@c PRIVMSG #chan :)echo hi"))
+
+    trio.run(main)
+    assert invoked == ["PRIVMSG"]
+    # Nor does it take a context
+    assert acquired == ["PRIVMSG"]
+
+
+def test_load_and_unload_rebuild_the_tables():
+    _, plugins = setup()
+    plugins.load(Greeter)
+    assert "hello" in plugins.tables["Greeter"]
+    assert plugins.events["_on_join"] == {"Greeter"}
+    with pytest.raises(ValueError, match="already loaded"):
+        plugins.load(Greeter)
+
+    plugins.unload("Greeter")
+    assert "Greeter" not in plugins.tables
+    assert "_on_join" not in plugins.events
+    assert plugins.commanders == {"Builtins"}
+    assert routed(plugins, ":a!b@c JOIN #chan") == set()
+
+
+def test_reload_picks_up_new_handlers(tmp_path, monkeypatch):
+    module = tmp_path / "reloadable_plugin.py"
+    module.write_text(textwrap.dedent("""
+        class Reloadable:
+            def __init__(self, network):
+                self.network = network
+
+            def first(self, irc, msg, text):
+                irc.reply("first")
+    """))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import reloadable_plugin
+
+    try:
+        _, plugins = setup()
+        plugins.load(reloadable_plugin.Reloadable)
+        old = plugins.pluginlist["Reloadable"]
+        module.write_text(textwrap.dedent("""
+            class Reloadable:
+                def __init__(self, network):
+                    self.network = network
+
+                def _on_join(self, irc, msg, text):
+                    irc.reply("second")
+        """))
+        plugins.reload("Reloadable")
+    finally:
+        sys.modules.pop("reloadable_plugin", None)
+
+    assert plugins.pluginlist["Reloadable"] is not old
+    assert "first" not in plugins.tables["Reloadable"]
+    assert plugins.events["_on_join"] == {"Reloadable"}
+    assert plugins.commanders == {"Builtins"}
+
+
+def test_full_sendq_defers_the_rest_to_more():
+    # One line a second and room for two: the reply backs up after a few lines
+    wsendq, rsendq = trio.open_memory_channel(0)
+    driver = Driver({"servers": [], "sendq_size": 2, "sendq_overflow": "more",
+        "flood_lines": (1.0, 1)}, rsendq, wsendq)
+    driver._conn = FakeStream()
+    network = Network({"network": "Test", "nick": "mjollnir", "ident": "mjollnir"}, driver)
+    network.capabilities["CHANTYPES"] = "#"
+    plugins = Plugins(network)
+    plugins.load(Talker)
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(driver._schedule)
+            nursery.start_soon(driver._write)
+            await plugins.dispatch(parser.parse(":a!b@c PRIVMSG #deferred :)talk"))
+            await trio.sleep(60)
+            nursery.cancel_scope.cancel()
+
+    try:
+        trio.run(main, clock=trio.testing.MockClock(autojump_threshold=0))
+    finally:
+        plugins.close()
+
+    mores = Env().mores.pop("#deferred")["b@c"]
+    assert mores
+    prefix = b"PRIVMSG #deferred :"
+    texts = []
+    for _, data in driver._conn.writes:
+        for line in data.split(b"\r\n")[:-1]:
+            assert line.startswith(prefix)
+            texts.append(line[len(prefix):])
+
+    suffix = utils.morefmt(len(mores)).encode()
+    assert texts[-1].endswith(suffix)
+    texts[-1] = texts[-1][:-len(suffix)]
+    # Cut with room for the suffix, nothing spills over on its own line
+    assert all(text.strip() for text in texts)
+    # )more pops from the end
+    texts.extend(bytes(msg.text) for msg in reversed(mores))
+    assert b"".join(texts).decode() == Talker.text
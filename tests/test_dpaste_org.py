@@ -0,0 +1,155 @@
+import contextlib
+import http.server
+import threading
+import urllib.parse
+
+import pytest
+import trio
+import trio.testing
+
+from ..core.utils import dpaste_org
+from ..core.utils.dpaste_org import PasteBin, YouShallNotPaste
+
+
+def run(f, *args):
+    return trio.run(f, *args, clock=trio.testing.MockClock(autojump_threshold=0))
+
+
+def pastebin(api):
+    # Around the Singleton, every test gets its own
+    inst = object.__new__(PasteBin)
+    inst.__init__(api)
+    return inst
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers["Content-Length"])
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode())
+        server.requests.append((self.path, self.client_address, form))
+        status = server.statuses.pop(0) if server.statuses else 200
+        body = f"https://paste.example/{len(server.requests)}\n".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # Hang up without saying so, like a server timing out an idle connection
+        self.close_connection = server.hangup
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_server(statuses=(), hangup=False):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    server.statuses = list(statuses)
+    server.hangup = hangup
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_port}/api/"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_paste_posts_the_form_and_returns_the_url():
+    with stub_server() as (server, api):
+        url = run(pastebin(api).paste, "line 1\nline 2")
+
+    assert url == "https://paste.example/1"
+    ((path, _, form),) = server.requests
+    assert path == "/api/"
+    assert form == {"format": ["url"], "expires": [dpaste_org.DEFAULT_EXPIRY],
+        "content": ["line 1\nline 2"]}
+
+
+def test_connection_is_kept_alive():
+    async def main(paster):
+        await paster.paste("one")
+        await paster.paste("two")
+        paster._conn.close()
+
+    with stub_server() as (server, api):
+        run(main, pastebin(api))
+
+    assert len({client for _, client, _ in server.requests}) == 1
+
+
+def test_closed_connection_is_retried():
+    async def main(paster):
+        await paster.paste("one")
+        return await paster.paste("two")
+
+    with stub_server(hangup=True) as (server, api):
+        url = run(main, pastebin(api))
+
+    assert url == "https://paste.example/2"
+    assert len({client for _, client, _ in server.requests}) == 2
+
+
+def test_error_status():
+    with stub_server(statuses=[500]) as (server, api):
+        with pytest.raises(YouShallNotPaste, match="HTTP Error 500"):
+            run(pastebin(api).paste, "text")
+
+
+def test_unreachable_server():
+    with stub_server() as (server, api):
+        pass
+
+    with pytest.raises(YouShallNotPaste):
+        run(pastebin(api).paste, "text")
+
+
+def test_grace_time_between_pastes():
+    async def main(paster):
+        finished = []
+
+        async def paste(text):
+            await paster.paste(text)
+            finished.append(trio.current_time())
+
+        async with trio.open_nursery() as nursery:
+            for i in range(3):
+                nursery.start_soon(paste, str(i))
+
+        return finished
+
+    with stub_server() as (server, api):
+        first, second, third = run(main, pastebin(api))
+
+    assert len(server.requests) == 3
+    # The first one goes right away, the other two wait their turn
+    assert first < dpaste_org.GRACE_TIME
+    assert second - first >= dpaste_org.GRACE_TIME
+    assert third - second >= dpaste_org.GRACE_TIME
+
+
+def test_too_many_pending_pastes_are_refused():
+    async def main(paster):
+        await paster.paste("first")
+        async with trio.open_nursery() as nursery:
+            # The clock stands still, they all wait out the grace time
+            for i in range(dpaste_org.MAX_PENDING):
+                nursery.start_soon(paster.paste, str(i))
+
+            await trio.testing.wait_all_tasks_blocked()
+            with pytest.raises(YouShallNotPaste, match="Too many"):
+                await paster.paste("one too many")
+
+            nursery.cancel_scope.cancel()
+
+        return paster._pending
+
+    with stub_server() as (server, api):
+        pending = trio.run(main, pastebin(api), clock=trio.testing.MockClock())
+
+    assert pending == 0
+    assert len(server.requests) == 1
@@ -0,0 +1,132 @@
+import pytest
+
+from ..core.irclib import commands, parser
+from ..core.enums import MsgType
+from ..core.mixins import IRCMsg
+
+PREFIX = ":nick!user@host.example"
+
+
+def relayed(msg):
+    # How the server hands our line to everyone else
+    return parser.parse(f"{PREFIX} {bytes(msg).decode()}")
+
+
+@pytest.mark.parametrize("msg, wire", [
+    (commands.msg("#chan", "hello world"), b"PRIVMSG #chan :hello world"),
+    (commands.msg("#chan", "word"), b"PRIVMSG #chan :word"),
+    (commands.msg("#chan", ":colon"), b"PRIVMSG #chan ::colon"),
+    (commands.notice("nick", ""), b"NOTICE nick :"),
+    (commands.mode("#chan", "+o", "nick"), b"MODE #chan +o nick"),
+    (commands.mode("#chan", "+k", ":key"), b"MODE #chan +k ::key"),
+    (commands.kick("#chan", "nick", "bye now"), b"KICK #chan nick :bye now"),
+    (commands.quit(), b"QUIT :"),
+    (commands.action("#chan", "waves"), b"PRIVMSG #chan :\x01ACTION waves\x01"),
+    (commands.ctcp("nick", "VERSION"), b"PRIVMSG nick :\x01VERSION\x01"),
+    (commands.ctcpreply("nick", "PING", "123 456"), b"NOTICE nick :\x01PING 123 456\x01"),
+])
+def test_wire_form(msg, wire):
+    assert bytes(msg) == wire
+
+
+@pytest.mark.parametrize("msg", [
+    commands.msg("#chan", "hello world"),
+    commands.msg("#chan", ":starts with a colon"),
+    commands.msg("#chan", "::"),
+    commands.msg("#chan", ""),
+    commands.notice("nick", "è unicode ❤"),
+])
+def test_roundtrip_text(msg):
+    parsed = relayed(msg)
+    assert parsed.type is msg.type
+    assert parsed.command == msg.command
+    assert parsed.args == msg.args
+    assert parsed.recipient == msg.recipient
+    assert parsed.text == msg.text
+
+
+@pytest.mark.parametrize("msg", [
+    commands.mode("#chan", "+ov", "nick"),
+    commands.mode("#chan", "+k", ":key"),
+    commands.kick("#chan", "nick", "bye now"),
+    commands.joins(["#a", "#b"], ["k1", "k2"]),
+    commands.part("#chan"),
+    IRCMsg(type=MsgType.SERVERCMD, command="PRIVMSG", args=["#chan", "a", "b c"]),
+])
+def test_roundtrip_args(msg):
+    parsed = relayed(msg)
+    assert parsed.command == msg.command
+    assert parsed.args == msg.args
+
+
+def test_roundtrip_memoryview_text():
+    data = memoryview("héllo wörld, more".encode())
+    msg = commands.msg("#chan", "placeholder").copy()
+    msg.encoded = True
+    msg.text = data[:len("héllo wörld".encode())]
+    assert bytes(msg) == "PRIVMSG #chan :héllo wörld".encode()
+    assert relayed(msg).text == "héllo wörld"
+
+
+def test_roundtrip_memoryview_args():
+    msg = IRCMsg(type=MsgType.SERVERCMD, command="TOPIC",
+        args=[memoryview(b"#chan"), memoryview(b"new topic")])
+    assert bytes(msg) == b"TOPIC #chan :new topic"
+    assert relayed(msg).args == ["#chan", "new topic"]
+
+    msg = IRCMsg(type=MsgType.SERVERCMD, command="MODE",
+        args=["#chan", memoryview(b"+k"), memoryview(b":key")])
+    assert relayed(msg).args == ["#chan", "+k", ":key"]
+
+
+@pytest.mark.parametrize("msg, ctcpname, text", [
+    (commands.ctcp("nick", "VERSION"), "VERSION", ""),
+    (commands.ctcp("nick", "PING", "123 456"), "PING", "123 456"),
+    (commands.ctcpreply("nick", "VERSION", "Mjollnir"), "VERSION", "Mjollnir"),
+])
+def test_roundtrip_ctcp(msg, ctcpname, text):
+    parsed = relayed(msg)
+    assert parsed.type is msg.type
+    assert parsed.ctcpname == ctcpname
+    assert parsed.text == text
+    assert parsed.recipient == "nick"
+
+
+def test_roundtrip_action():
+    parsed = relayed(commands.action("#chan", "waves hello"))
+    assert parsed.type is MsgType.ACTION
+    assert parsed.text == "waves hello"
+
+
+@pytest.mark.parametrize("args", [
+    ["#chan", "other", "bye now"],
+    ["#chan"],
+    [":colon"],
+    [],
+])
+def test_roundtrip_clientcmd(args):
+    msg = IRCMsg(nick="nick", ident="user", hostname="host.example",
+        type=MsgType.CLIENTCMD, command="KICK", args=args)
+    parsed = parser.parse(bytes(msg).decode())
+    assert parsed.type is MsgType.CLIENTCMD
+    assert (parsed.nick, parsed.ident, parsed.hostname) == ("nick", "user", "host.example")
+    assert parsed.command == "KICK"
+    assert parsed.args == args
+
+
+def test_reencode_parsed():
+    line = f"{PREFIX} KICK #chan other ::colon and spaces"
+    assert bytes(parser.parse(line)) == line.encode()
+
+
+@pytest.mark.parametrize("args", [
+    ["a b", "c"],
+    [":a", "c"],
+    ["", "c"],
+    [b"a b", "c"],
+    [memoryview(b":a"), "c"],
+])
+def test_invalid_middle_parameter(args):
+    msg = IRCMsg(type=MsgType.SERVERCMD, command="X", args=args)
+    with pytest.raises(ValueError, match="middle parameter"):
+        bytes(msg)
@@ -0,0 +1,104 @@
+import os
+import time
+
+import trio
+
+from ..core.irclib import parser
+from ..core.irclib.context import IRCContext
+from ..core.mixins import CaseMapping
+from ..plugins.executors import Executors, ProcessPool
+
+
+class FakeNetwork:
+    name = "Test"
+    identity = {"nick": "mjollnir", "ident": "mjollnir"}
+    hostname = "bot.example"
+    capabilities = {"CHANTYPES": "#"}
+    casemapping = CaseMapping()
+
+
+class Plugin:
+    def __init__(self, network):
+        self.network = network
+        self.greeting = "hello"
+
+    def greet(self, ctx, msg, args):
+        ctx.reply(f"{self.greeting} {args} from {self.network.name}")
+
+
+def nap(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def fail():
+    raise ValueError("nope")
+
+
+def test_process_handlers_get_their_instance():
+    async def main():
+        executors = Executors()
+        network = FakeNetwork()
+        ctx = IRCContext(network)
+        ctx.set_message(parser.parse(":a!b@c PRIVMSG #chan :)greet world"))
+        try:
+            await executors.process(Plugin(network).greet, ctx, ctx.incoming, "world")
+        finally:
+            executors.close()
+
+        return [msg.text for msg in ctx.responses]
+
+    assert trio.run(main) == ["hello world from Test"]
+
+
+def test_cancel_kills_only_its_own_worker():
+    async def main():
+        pool = ProcessPool(2)
+        results = {}
+
+        async def job(name, seconds):
+            results[name] = await pool.run(nap, seconds)
+
+        async def cancelled():
+            with trio.move_on_after(1):
+                await pool.run(nap, 30)
+
+            results["cancelled"] = trio.current_time()
+
+        start = trio.current_time()
+        try:
+            async with trio.open_nursery() as nursery:
+                nursery.start_soon(job, "slow", 2)
+                nursery.start_soon(cancelled)
+        finally:
+            pool.close()
+
+        return start, results
+
+    start, results = trio.run(main)
+    assert results["cancelled"] - start < 10
+    assert isinstance(results["slow"], int)
+
+
+def test_workers_are_reused_and_survive_errors():
+    async def main():
+        pool = ProcessPool(1)
+        try:
+            first = await pool.run(nap, 0)
+            try:
+                await pool.run(fail)
+            except RuntimeError as e:
+                error = str(e)
+
+            second = await pool.run(nap, 0)
+            third = await pool.run(nap, 0)
+        finally:
+            pool.close()
+
+        return first, error, second, third
+
+    first, error, second, third = trio.run(main)
+    assert error == "ValueError: nope"
+    # A job raising doesn't cost its worker
+    assert second == first
+    assert third == first
@@ -0,0 +1,239 @@
+import trio
+import trio.testing
+
+from ..core.drivers.floodcontrol import FloodControl, TokenBucket
+from ..core.drivers.trio_driver import Driver
+from ..core.irclib import commands
+
+
+def run(f, *args):
+    return trio.run(f, *args, clock=trio.testing.MockClock(autojump_threshold=0))
+
+
+async def _drain(flood, count):
+    out = []
+    for _ in range(count):
+        data = await flood.get()
+        out.append((trio.current_time(), data))
+
+    return out
+
+
+def test_bucket_delay():
+    async def main():
+        bucket = TokenBucket(2.0, 4)
+        assert bucket.delay(4) == 0
+        bucket.consume(4)
+        assert bucket.delay(1) == 0.5
+        await trio.sleep(1)
+        assert bucket.delay(2) == 0
+        # Never more than the burst is waited for
+        assert bucket.delay(100) == 1
+
+    run(main)
+
+
+def test_line_pacing():
+    async def main():
+        flood = FloodControl(line_rate=(2.0, 4), byte_rate=(1e9, 1e9))
+        for idx in range(8):
+            flood.put(b"line %d" % idx, "#chan")
+
+        out = await _drain(flood, 8)
+        assert [data for _, data in out] == [b"line %d" % idx for idx in range(8)]
+        # The burst goes out at once, then one line every 1 / rate seconds
+        assert [t for t, _ in out] == [0, 0, 0, 0, 0.5, 1.0, 1.5, 2.0]
+
+    run(main)
+
+
+def test_byte_pacing():
+    async def main():
+        flood = FloodControl(line_rate=(100.0, 100), byte_rate=(100.0, 300))
+        for _ in range(5):
+            flood.put(b"x" * 100, "#chan")
+
+        out = await _drain(flood, 5)
+        assert [t for t, _ in out] == [0, 0, 0, 1.0, 2.0]
+
+    run(main)
+
+
+def test_round_robin():
+    async def main():
+        flood = FloodControl(line_rate=(1e9, 1e9), byte_rate=(1e9, 1e9))
+        for target, count in (("#a", 3), ("#b", 3), ("#c", 1)):
+            for idx in range(count):
+                flood.put(f"{target} {idx}".encode(), target)
+
+        out = [data.decode() for _, data in await _drain(flood, 7)]
+        assert out == ["#a 0", "#b 0", "#c 0", "#a 1", "#b 1", "#a 2", "#b 2"]
+
+    run(main)
+
+
+def test_priority_jumps_the_queue():
+    async def main():
+        flood = FloodControl(line_rate=(1.0, 1), byte_rate=(1e9, 1e9))
+        for idx in range(3):
+            flood.put(b"msg %d" % idx, "#chan")
+
+        got = []
+
+        async def writer():
+            while True:
+                data = await flood.get()
+                got.append((trio.current_time(), data))
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(writer)
+            await trio.sleep(0.25)
+            flood.put(b"PONG :x", priority=True)
+            await trio.sleep(5)
+            nursery.cancel_scope.cancel()
+
+        # Sent as soon as it arrives without waiting for the bucket, but
+        # still counted against it
+        assert got == [(0, b"msg 0"), (0.25, b"PONG :x"), (2.0, b"msg 1"), (3.0, b"msg 2")]
+
+    run(main)
+
+
+def test_rounding_does_not_stall():
+    async def main():
+        bucket = TokenBucket(1.0, 1)
+        bucket.consume(1)
+        await trio.sleep(0.1)
+        bucket.consume(1)
+        await trio.sleep(bucket.delay(1))
+        assert bucket.delay(1) == 0
+
+    run(main)
+
+
+def test_drop_oldest():
+    async def main():
+        flood = FloodControl()
+        flood.put(b"a0", "#a")
+        flood.put(b"b0", "#b")
+        flood.put(b"a1", "#a")
+        assert flood.drop_oldest()
+        assert len(flood) == 2 and flood.dropped == 1
+        # #a keeps its turn, with only a1 left in it
+        assert flood.get_nowait() == b"a1"
+        assert flood.get_nowait() == b"b0"
+        assert not flood.drop_oldest()
+
+    run(main)
+
+
+class FakeStream:
+    def __init__(self):
+        self.writes = []
+
+    async def send_all(self, data):
+        self.writes.append((trio.current_time(), bytes(data)))
+
+
+def _driver(**identity):
+    wsendq, rsendq = trio.open_memory_channel(16)
+    driver = Driver({"servers": [], **identity}, rsendq, wsendq)
+    driver._conn = FakeStream()
+    return driver
+
+
+def test_write_coalesces_and_paces():
+    async def main():
+        driver = _driver(flood_lines=(2.0, 3), flood_bytes=(1e9, 1e9))
+        for idx in range(5):
+            driver._enqueue(f"PRIVMSG #chan :{idx}", "#chan", False)
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(driver._write)
+            await trio.sleep(10)
+            nursery.cancel_scope.cancel()
+
+        writes = driver._conn.writes
+        # Whatever the burst allows goes out in one write
+        assert writes[0] == (0, b"PRIVMSG #chan :0\r\nPRIVMSG #chan :1\r\nPRIVMSG #chan :2\r\n")
+        assert writes[1:] == [(0.5, b"PRIVMSG #chan :3\r\n"), (1.0, b"PRIVMSG #chan :4\r\n")]
+        assert driver.write_stats.lines == 5
+
+    run(main)
+
+
+def test_write_batch_limit():
+    async def main():
+        driver = _driver(write_batch=40, flood_lines=(1e9, 1e9), flood_bytes=(1e9, 1e9))
+        for idx in range(4):
+            driver._enqueue(f"PRIVMSG #chan :{idx}", "#chan", False)
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(driver._write)
+            await trio.sleep(1)
+            nursery.cancel_scope.cancel()
+
+        assert [len(data) for _, data in driver._conn.writes] == [36, 36]
+
+    run(main)
+
+
+def test_send_priority_bypasses_sendq():
+    async def main():
+        driver = _driver(flood_lines=(1.0, 1), flood_bytes=(1e9, 1e9))
+        driver._enqueue("PRIVMSG #chan :first", "#chan", False)
+        driver._enqueue("PRIVMSG #chan :second", "#chan", False)
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(driver._write)
+            await trio.sleep(0.1)
+            await driver.send("PONG :irc.example.net")
+            await trio.sleep(2)
+            nursery.cancel_scope.cancel()
+
+        assert driver._conn.writes == [
+            (0, b"PRIVMSG #chan :first\r\n"),
+            (0.1, b"PONG :irc.example.net\r\n"),
+            (2.0, b"PRIVMSG #chan :second\r\n"),
+        ]
+
+    run(main)
+
+
+def test_send_nowait_skips_a_full_sendq():
+    async def main():
+        driver = _driver(flood_lines=(1.0, 1), flood_bytes=(1e9, 1e9))
+        # Nobody drains the send queue
+        for idx in range(16):
+            driver.wsendq.send_nowait(f"PRIVMSG #chan :{idx}")
+
+        driver.send_nowait(commands.mode("#chan"))
+        driver.send_nowait(commands.mode("#chan", "+b"))
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(driver._write)
+            await trio.sleep(2)
+            nursery.cancel_scope.cancel()
+
+        # Still paced by the buckets
+        assert driver._conn.writes == [(0, b"MODE #chan\r\n"), (1.0, b"MODE #chan +b\r\n")]
+
+    run(main)
+
+
+def test_rejected_message_does_not_stop_the_writer():
+    async def main():
+        driver = _driver(flood_lines=(1e9, 1e9), flood_bytes=(1e9, 1e9))
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(driver._schedule)
+            nursery.start_soon(driver._write)
+            await driver.send(commands.msg("#chan :oops", "dropped"))
+            await driver.send(commands.msg("#chan", "first"))
+            await trio.sleep(1)
+            await driver.send(commands.msg("#chan", "second"))
+            await trio.sleep(1)
+            nursery.cancel_scope.cancel()
+
+        assert [data for _, data in driver._conn.writes] == [
+            b"PRIVMSG #chan :first\r\n", b"PRIVMSG #chan :second\r\n"]
+
+    run(main)
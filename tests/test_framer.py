@@ -0,0 +1,32 @@
+from ..core.irclib.framer import LineFramer
+
+
+def test_split_across_reads():
+    framer = LineFramer()
+    assert framer.feed(b"PING :a\r\nPI") == [b"PING :a"]
+    assert framer.feed(b"NG :b\r") == []
+    assert framer.feed(b"\n\r\n") == [b"PING :b"]
+    assert framer.pending == 0
+
+
+def test_overlong_line_in_one_read():
+    framer = LineFramer(maxlen=10)
+    assert framer.feed(b"x" * 30 + b"\r\nok\r\n") == [b"ok"]
+
+
+def test_overlong_line_completed_by_a_read():
+    framer = LineFramer(maxlen=10)
+    assert framer.feed(b"x" * 8) == []
+    assert framer.feed(b"x" * 8 + b"\nok\n") == [b"ok"]
+
+
+def test_overlong_line_spanning_reads():
+    framer = LineFramer(maxlen=10)
+    assert framer.feed(b"x" * 40) == []
+    assert framer.feed(b"x\nok\n") == [b"ok"]
+
+
+def test_line_at_the_limit():
+    framer = LineFramer(maxlen=10)
+    assert framer.feed(b"0123456789\r") == []
+    assert framer.feed(b"\n") == [b"0123456789"]
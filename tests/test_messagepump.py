@@ -0,0 +1,132 @@
+import trio
+import trio.testing
+
+from ..core.irclib import parser
+from ..core.enums import MsgType
+from ..core.mixins import MessagePump, Sink, SINK_DROP, DROP_WARN_INTERVAL
+
+
+def run(f, *args):
+    return trio.run(f, *args, clock=trio.testing.MockClock(autojump_threshold=0))
+
+
+def source(lines):
+    async def receive():
+        for line in lines:
+            yield parser.parse(line)
+
+    return receive
+
+
+def test_slow_plugins_dont_hold_up_the_bookkeeper():
+    async def main():
+        seen = []
+        handled = []
+
+        async def bookkeeper(msgs):
+            for msg in msgs:
+                seen.append((trio.current_time(), msg.command))
+
+        async def plugin(msg):
+            await trio.sleep(10)
+            handled.append(msg)
+
+        lines = [":a!b@c PRIVMSG #chan :)slow"] * 300 + ["PING :irc"]
+        pump = MessagePump()
+        pump.attach_source(source(lines))
+        pump.add_batch_sink(bookkeeper, [MsgType.ALL])
+        pump.add_sink(plugin, [MsgType.ALL], concurrency=1,
+            key=lambda msg: msg.recipient, overflow=SINK_DROP)
+        await pump.run()
+
+        assert seen[-1] == (0, "PING")
+        assert len(seen) == 301
+        sink = pump.sinks[1]
+        assert sink.dropped > 0
+        # The PING went to the plugins as well
+        assert len(handled) + sink.dropped == 301
+
+    run(main)
+
+
+def test_full_lane_doesnt_block_other_lanes():
+    async def main():
+        handled = []
+
+        async def plugin(msg):
+            if msg.recipient == "#slow":
+                await trio.sleep(10)
+
+            handled.append((trio.current_time(), msg.recipient))
+
+        lines = [":a!b@c PRIVMSG #slow :)cmd"] * 300 + [":a!b@c PRIVMSG #fast :)cmd"]
+        pump = MessagePump()
+        pump.attach_source(source(lines))
+        pump.add_sink(plugin, [MsgType.ALL], concurrency=1,
+            key=lambda msg: msg.recipient, overflow=SINK_DROP)
+        await pump.run()
+
+        assert (0, "#fast") in handled
+
+    run(main)
+
+
+def test_blocking_sink_sees_everything_in_order():
+    async def main():
+        seen = []
+
+        async def sink(msg):
+            await trio.sleep(1)
+            seen.append(msg.text)
+
+        lines = [f":a!b@c PRIVMSG #chan :{idx}" for idx in range(200)]
+        pump = MessagePump()
+        pump.attach_source(source(lines))
+        pump.add_sink(sink, [MsgType.ALL])
+        await pump.run()
+
+        assert seen == [str(idx) for idx in range(200)]
+        assert pump.sinks[0].dropped == 0
+
+    run(main)
+
+
+def test_command_filter():
+    async def main():
+        seen = []
+
+        async def sink(msgs):
+            seen.extend(msg.command for msg in msgs)
+
+        lines = [":a!b@c PRIVMSG #chan :hi", ":a!b@c JOIN #chan", "PING :irc"]
+        pump = MessagePump()
+        pump.attach_source(source(lines))
+        pump.add_batch_sink(sink, [MsgType.ALL], commands=["JOIN", "PING"])
+        await pump.run()
+
+        assert seen == ["JOIN", "PING"]
+
+    run(main)
+
+
+def test_drops_are_warned_about_once_a_minute(caplog):
+    async def main():
+        async def plugin(msg):
+            pass
+
+        msg = parser.parse(":a!b@c PRIVMSG #chan :hi")
+        sink = Sink(plugin, [MsgType.ALL], False, queuesize=1, overflow=SINK_DROP)
+        await sink.put([msg] * 5)
+        await trio.sleep(DROP_WARN_INTERVAL - 1)
+        await sink.put([msg])
+        await trio.sleep(1)
+        await sink.put([msg] * 2)
+        return sink.dropped
+
+    with caplog.at_level("WARNING", logger="mjollnir"):
+        assert run(main) == 7
+
+    assert [record.getMessage().split(" for ")[0] for record in caplog.records] == [
+        "mixins.Sink Overloaded, dropped 1 messages",
+        "mixins.Sink Overloaded, dropped 5 messages",
+    ]
@@ -0,0 +1,156 @@
+from types import SimpleNamespace
+
+import pytest
+import trio
+import trio.testing
+
+from ..plugins.nested import NestedEvaluator, NestedScanner
+
+
+@pytest.mark.parametrize("text,tree", [
+    ("echo hi", ["echo hi"]),
+    ("a {b} c", ["a ", ["b"], " c"]),
+    ("{a}{b}", [["a"], ["b"]]),
+    ("{{{{a}}}}", [[[[["a"]]]]]),
+    # Escaped braces are plain text, other backslashes are left alone
+    (r"\{a\}", ["{a}"]),
+    (r"a\\{b}", ["a\\", ["b"]]),
+    (r"x\y", [r"x\y"]),
+    ("a\\", ["a\\"]),
+])
+def test_scan(text, tree):
+    assert NestedScanner().scan(text) == tree
+
+
+@pytest.mark.parametrize("text,error", [
+    ("{a", "Missing 1 closing '}'"),
+    ("{{a}", "Missing 1 closing '}'"),
+    ("a}", "Missing 1 opening '{'"),
+    ("{a}}}", "Missing 2 opening '{'"),
+    ("}a{", "Missing 1 opening '{'"),
+    (r"{a\}", "Missing 1 closing '}'"),
+    ("{{{{{a}}}}}", "Nesting deeper than 4 levels"),
+])
+def test_scan_errors(text, error):
+    with pytest.raises(ValueError) as excinfo:
+        NestedScanner().scan(text)
+
+    assert str(excinfo.value) == error
+
+
+def test_scan_length_limit():
+    scanner = NestedScanner(maxlength=10)
+    assert scanner.scan("a" * 10) == ["a" * 10]
+    with pytest.raises(ValueError, match="^Expression longer than 10 characters$"):
+        scanner.scan("a" * 11)
+
+    # Checked before scanning anything
+    with pytest.raises(ValueError, match="longer than"):
+        scanner.scan("{" * 11)
+
+
+def test_scan_depth_limit():
+    scanner = NestedScanner(maxdepth=2)
+    assert scanner.scan("{{a}}") == [[["a"]]]
+    with pytest.raises(ValueError, match="^Nesting deeper than 2 levels$"):
+        scanner.scan("{{{a}}}")
+
+    # Unbalanced closing braces don't count towards it
+    with pytest.raises(ValueError, match="opening"):
+        scanner.scan("}}}{{{")
+
+
+class Context:
+    def __init__(self):
+        self.responses = []
+
+
+def evaluator(pure=False, delay=0, **limits):
+    contexts = []
+    executed = []
+
+    def new_context():
+        contexts.append(Context())
+        return contexts[-1]
+
+    async def execute(ctx, line):
+        executed.append((trio.current_time(), line))
+        await trio.sleep(delay)
+        if line == "boom":
+            raise KeyError(line)
+        elif line == "twice":
+            ctx.responses.append(SimpleNamespace(text="boom"))
+            ctx.responses.append(SimpleNamespace(text="boom"))
+        else:
+            ctx.responses.append(SimpleNamespace(text=line.upper()))
+
+    inst = NestedEvaluator(execute, new_context, lambda line: pure, **limits)
+    return inst, contexts, executed
+
+
+def evaluate(inst, text):
+    return trio.run(inst.evaluate, NestedScanner().scan(text), Context(),
+        clock=trio.testing.MockClock(autojump_threshold=0))
+
+
+def test_expansion():
+    inst, _, executed = evaluator()
+    assert evaluate(inst, "echo {a b}") == ["ECHO A B"]
+    assert evaluate(inst, "x{echo {a}}") == ["XECHO A"]
+
+
+def test_expansion_is_capped_across_levels():
+    # Every level stays under the limit, together they don't
+    inst, contexts, executed = evaluator(maxexpansion=4)
+    with pytest.raises(ValueError, match="more than 4 commands"):
+        evaluate(inst, "{a}{b}{c}{d}{e}")
+
+    assert len(executed) <= 4
+
+
+def test_length_is_capped_across_levels():
+    inst, _, _ = evaluator(maxlength=10)
+    with pytest.raises(ValueError, match="more than 10 characters"):
+        evaluate(inst, "{abcd}{efgh}{ij}")
+
+
+def test_sibling_limit_errors_are_not_a_multierror():
+    inst, _, _ = evaluator(maxdepth=1)
+    with pytest.raises(ValueError, match="deeper than 1"):
+        evaluate(inst, "{{{a}}}{{{b}}}{{{c}}}")
+
+
+def test_totals_reset_between_evaluations():
+    inst, _, _ = evaluator(maxexpansion=2)
+    assert evaluate(inst, "{a}") == ["A"]
+    assert evaluate(inst, "{b}") == ["B"]
+
+
+def test_pure_commands_run_once():
+    inst, _, executed = evaluator(pure=True)
+    assert evaluate(inst, "{echo a}{echo a}") == ["ECHO AECHO A"]
+    assert [line for _, line in executed] == ["echo a", "ECHO AECHO A"]
+
+
+def test_impure_commands_run_every_time():
+    inst, _, executed = evaluator()
+    evaluate(inst, "{echo a}{echo a}")
+    assert [line for _, line in executed] == ["echo a", "echo a", "ECHO AECHO A"]
+
+
+def test_siblings_run_concurrently():
+    inst, _, executed = evaluator(delay=1)
+    assert evaluate(inst, "{a}{b}{c {d}}") == ["ABC D"]
+    started = {line: when for when, line in executed}
+    # {d} first, then the three siblings side by side, then the whole line
+    assert started == {"d": 0, "a": 0, "b": 0, "c D": 1, "ABC D": 2}
+
+
+def test_sibling_command_errors_are_not_a_multierror():
+    inst, _, _ = evaluator()
+    with pytest.raises(KeyError):
+        evaluate(inst, "{boom}{boom}")
+
+    # Two rows of the same level failing
+    with pytest.raises(KeyError):
+        evaluate(inst, "{twice}")
@@ -0,0 +1,50 @@
+from ..core.mixins import Network
+
+
+def network():
+    return Network({"network": "Test", "nick": "mjollnir", "altnick": "mjollnir_"}, None)
+
+
+def members(network):
+    # The reverse index, nick -> names of the channels it's in
+    return {nick.name: sorted(channel.name for channel in nick.channels)
+        for nick in network.users.values()}
+
+
+def test_rejoin_replaces_the_channel():
+    net = network()
+    net.add_channel("#chan")
+    net.add_member("#chan", "bob")
+    net.add_channel("#other")
+    net.add_member("#other", "alice")
+    # Kicked and rejoined, the PART never came
+    rejoined = net.add_channel("#Chan")
+    assert net.channels["#chan"] is rejoined
+    assert members(net) == {"alice": ["#other"]}
+
+    net.add_member("#chan", "bob")
+    net.add_member("#chan", "alice")
+    assert members(net) == {"bob": ["#Chan"], "alice": ["#Chan", "#other"]}
+
+    net.remove_channel("#chan")
+    assert members(net) == {"alice": ["#other"]}
+
+
+def test_part_and_quit():
+    net = network()
+    for name in ("#a", "#b"):
+        net.add_channel(name)
+        net.add_member(name, "bob")
+        net.add_member(name, "alice")
+
+    net.add_channel("#a")
+    net.add_member("#a", "bob")
+    net.remove_member("#b", "bob")
+    assert members(net) == {"bob": ["#a"], "alice": ["#b"]}
+
+    net.remove_user("alice")
+    assert "alice" not in net.users
+    assert "alice" not in net.channels["#b"]
+
+    net.remove_channel("#a")
+    assert members(net) == {}
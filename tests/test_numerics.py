@@ -0,0 +1,87 @@
+import trio
+
+from ..core.bookkeeping import numerics
+from ..core.irclib import parser
+from ..core.mixins import Network
+
+
+def network(*isupport):
+    net = Network({"network": "Test", "nick": "mjollnir", "altnick": "mjollnir_"}, None)
+    if isupport:
+        feed(net, f":irc 005 mjollnir {' '.join(isupport)} :are supported")
+
+    net.add_channel("#chan")
+    return net
+
+
+def feed(net, *lines):
+    async def main():
+        for line in lines:
+            msg = parser.parse(line)
+            await numerics.HANDLERS.handlers[msg.command](net, msg)
+
+    trio.run(main)
+
+
+def members(net, channel="#chan"):
+    ch = net.channels[channel]
+    return {name: ch.grade(name) for name in ch}
+
+
+def test_names_are_committed_on_366():
+    net = network()
+    net.add_member("#chan", "gone")
+    feed(net, ":irc 353 mjollnir = #chan :mjollnir bob",
+        ":irc 353 mjollnir = #chan :carol")
+    # Nothing changes until the list is complete
+    assert members(net) == {"gone": 0}
+
+    feed(net, ":irc 366 mjollnir #chan :End of /NAMES list.")
+    assert members(net) == {"mjollnir": 0, "bob": 0, "carol": 0}
+    assert "gone" not in net.users
+    assert net.channels["#chan"].names == []
+
+
+def test_prefixes_default_to_rfc1459():
+    net = network()
+    feed(net, ":irc 353 mjollnir = #chan :@bob +carol dave",
+        ":irc 366 mjollnir #chan :End")
+    op, voice = net.prefix_map["@"], net.prefix_map["+"]
+    assert members(net) == {"bob": op, "carol": voice, "dave": 0}
+
+
+def test_advertised_prefixes_with_multi_prefix():
+    net = network("PREFIX=(qaohv)~&@%+")
+    feed(net, ":irc 353 mjollnir = #chan :~@alice %+bob carol",
+        ":irc 366 mjollnir #chan :End")
+    prefix_map = net.prefix_map
+    assert members(net) == {"alice": prefix_map["~"] | prefix_map["@"],
+        "bob": prefix_map["%"] | prefix_map["+"], "carol": 0}
+
+
+def test_no_prefixes():
+    net = network("PREFIX=")
+    feed(net, ":irc 353 mjollnir = #chan :@bob", ":irc 366 mjollnir #chan :End")
+    assert members(net) == {"@bob": 0}
+
+
+def test_userhost_in_names():
+    net = network()
+    feed(net, ":irc 353 mjollnir = #chan :@bob!~b@bob.example carol!c@h",
+        ":irc 366 mjollnir #chan :End")
+    bob = net.users["bob"]
+    assert (bob.ident, bob.hostname) == ("~b", "bob.example")
+    assert members(net) == {"bob": net.prefix_map["@"], "carol": 0}
+
+
+def test_366_without_353():
+    net = network()
+    net.add_member("#chan", "bob")
+    feed(net, ":irc 366 mjollnir #chan :End", ":irc 366 mjollnir #nowhere :End")
+    assert members(net) == {"bob": 0}
+
+
+def test_353_for_other_channels_is_ignored():
+    net = network()
+    feed(net, ":irc 353 mjollnir = #nowhere :bob", ":irc 366 mjollnir #nowhere :End")
+    assert "bob" not in net.users
@@ -0,0 +1,135 @@
+import pickle
+
+import pytest
+
+from ..core.irclib import parser
+from ..core.enums import MsgType
+
+
+def test_command_without_arguments():
+    msg = parser.parse(":nick!u@h QUIT")
+    assert msg.command == "QUIT"
+    assert msg.type is MsgType.CLIENTCMD
+    assert msg.nick == "nick"
+    assert msg.args == []
+
+
+def test_command_without_arguments_trailing_spaces():
+    msg = parser.parse(":nick!u@h AWAY   ")
+    assert msg.command == "AWAY"
+    assert msg.args == []
+
+
+def test_privmsg_without_arguments():
+    assert parser.parse(":nick!u@h PRIVMSG") is None
+    assert parser.parse(":nick!u@h NOTICE") is None
+
+
+def test_recipient_without_arguments():
+    assert parser.parse(":irc.server 042").recipient is None
+
+
+def test_pickled_message_keeps_its_fields():
+    for line in (":nick!u@h JOIN #chan", "@a=b :nick!u@h PRIVMSG #chan :hi"):
+        msg = parser.parse(line)
+        again = pickle.loads(pickle.dumps(msg))
+        assert again.tags == msg.tags
+        assert (again.nick, again.args, again.recipient) == (msg.nick, msg.args, msg.recipient)
+
+
+def test_untagged_messages_share_read_only_tags():
+    first = parser.parse("PING :a")
+    second = pickle.loads(pickle.dumps(parser.parse("PING :b")))
+    assert first.tags == {}
+    assert first.tags is second.tags
+    with pytest.raises(TypeError):
+        first.tags["a"] = "b"
+
+
+def test_empty_command():
+    assert parser.parse(":nick!u@h ") is None
+    assert parser.parse("") is None
+
+
+# Line -> fields of the parsed message
+CORPUS = [
+    ("PING :irc.example.net",
+        dict(command="PING", type=MsgType.SERVERCMD, nick=None, args=["irc.example.net"])),
+    ("PING irc.example.net",
+        dict(command="PING", args=["irc.example.net"])),
+    ("privmsg #chan :lowercase command",
+        dict(command="PRIVMSG", type=MsgType.SERVERCMD, args=["#chan", "lowercase command"])),
+    (":irc.example.net 001 me :Welcome to the network me!u@h",
+        dict(command="001", type=MsgType.NUMERIC, nick="irc.example.net", ident=None,
+            hostname=None, recipient="me", args=["me", "Welcome to the network me!u@h"])),
+    (":irc.example.net 005 me PREFIX=(ov)@+ CHANTYPES=# :are supported by this server",
+        dict(command="005", args=["me", "PREFIX=(ov)@+", "CHANTYPES=#",
+            "are supported by this server"])),
+    (":irc.example.net   353   me = #chan   :@a +b c",
+        dict(command="353", recipient="me", args=["me", "=", "#chan", "@a +b c"])),
+    (":irc.example.net 376",
+        dict(command="376", type=MsgType.NUMERIC, recipient=None, args=[])),
+    (":irc.example.net NOTICE * :*** Looking up your hostname",
+        dict(type=MsgType.NOTICE, nick="irc.example.net", recipient="*",
+            text="*** Looking up your hostname")),
+    (":nick!~user@host.example PRIVMSG #chan :hello world",
+        dict(type=MsgType.REGULAR, nick="nick", ident="~user", hostname="host.example",
+            recipient="#chan", text="hello world", args=["#chan", "hello world"])),
+    (":nick!~user@host.example PRIVMSG #chan ::starts with a colon",
+        dict(text=":starts with a colon")),
+    (":nick!~user@host.example PRIVMSG #chan :",
+        dict(type=MsgType.REGULAR, text="", args=["#chan", ""])),
+    (":nick!~user@host.example PRIVMSG #chan word",
+        dict(text="word")),
+    (":nick!~user@host.example PRIVMSG me :\x01VERSION\x01",
+        dict(type=MsgType.CTCP, ctcpname="VERSION", text="", recipient="me")),
+    (":nick!~user@host.example PRIVMSG #chan :\x01ACTION waves\x01",
+        dict(type=MsgType.ACTION, text="waves", recipient="#chan")),
+    (":nick!~user@host.example NOTICE me :\x01version mIRC\x01",
+        dict(type=MsgType.CTCPREPLY, ctcpname="VERSION", text="mIRC")),
+    (":nick!~user@host.example MODE #chan +ov nick nick",
+        dict(type=MsgType.CLIENTCMD, recipient="#chan", args=["#chan", "+ov", "nick", "nick"])),
+    (":nick!~user@host.example JOIN #chan",
+        dict(command="JOIN", type=MsgType.CLIENTCMD, args=["#chan"])),
+    (":nick!~user@host.example JOIN :#chan",
+        dict(command="JOIN", args=["#chan"])),
+    (":nick!~user@host.example QUIT",
+        dict(command="QUIT", nick="nick", args=[])),
+    (":nick!~user@host.example QUIT :Quit: bye",
+        dict(command="QUIT", args=["Quit: bye"])),
+    (":nick!~user@host.example AWAY",
+        dict(command="AWAY", args=[])),
+    (":nick KICK #chan other :reason",
+        dict(nick="nick", ident=None, hostname=None, args=["#chan", "other", "reason"])),
+    ("@time=2023-01-01T00:00:00.000Z;msgid=abc :nick!u@h PRIVMSG #chan :tagged",
+        dict(tags={"time": "2023-01-01T00:00:00.000Z", "msgid": "abc"}, nick="nick",
+            text="tagged")),
+    ("@a=b\\:c\\sd\\\\e\\r\\nf;flag;empty= :nick!u@h TAGMSG #chan",
+        dict(tags={"a": "b;c d\\e\r\nf", "flag": "", "empty": ""}, command="TAGMSG",
+            args=["#chan"])),
+    ("@+draft/reply=x\\ :n!u@h PRIVMSG #c :lone backslash",
+        dict(tags={"+draft/reply": "x"}, text="lone backslash")),
+    ("@a=\\b\\ PING :x",
+        dict(tags={"a": "b"})),
+    ("@a=1;a=2 PING :x",
+        dict(tags={"a": "2"}, command="PING", nick=None)),
+    ("@tag=1   :irc.example.net 042 me UID :your unique ID",
+        dict(tags={"tag": "1"}, nick="irc.example.net", args=["me", "UID", "your unique ID"])),
+    (":nick!u@h PRIVMSG #chan :è unicode ❤",
+        dict(text="è unicode ❤")),
+]
+
+MALFORMED = ["", ":onlyprefix", ":prefix ", "@tags", "@tags :prefix"]
+
+
+@pytest.mark.parametrize("line, fields", CORPUS)
+def test_corpus(line, fields):
+    msg = parser.parse(line)
+    assert msg is not None
+    for name, value in fields.items():
+        assert getattr(msg, name) == value, name
+
+
+@pytest.mark.parametrize("line", MALFORMED)
+def test_malformed(line):
+    assert parser.parse(line) is None
@@ -0,0 +1,151 @@
+import os
+import random
+
+import pytest
+
+from ..core.utils import graphemetables, utf8utils
+from ..core.utils.utf8utils import UTF8Chunker, split
+
+# The Unicode conformance test for the version of graphemetables
+BREAK_TEST = os.path.join(os.path.dirname(__file__), "data", "GraphemeBreakTest.txt")
+
+# In the format of GraphemeBreakTest.txt: ÷ is a boundary, × is not
+GRAPHEME_BREAKS = [
+    # CRLF and controls
+    "÷ 000D × 000A ÷",
+    "÷ 0061 ÷ 000D × 000A ÷ 0062 ÷",
+    "÷ 000A ÷ 000D ÷",
+    "÷ 000D ÷ 000D × 000A ÷",
+    "÷ 000D ÷ 0308 ÷",
+    "÷ 0001 ÷ 0308 ÷",
+    "÷ 0061 ÷ 0001 ÷",
+    # Extend and SpacingMark
+    "÷ 0061 × 0308 ÷ 0062 ÷",
+    "÷ 0020 × 0308 × 0301 ÷",
+    "÷ 0915 × 093F ÷",
+    "÷ 0E01 × 0E33 ÷",
+    # Prepend
+    "÷ 0600 × 0020 ÷",
+    "÷ 0600 × 0061 × 0308 ÷",
+    "÷ 0600 ÷ 000A ÷",
+    "÷ 0061 ÷ 0600 ÷",
+    # Hangul
+    "÷ 1100 × 1161 × 11A8 ÷",
+    "÷ 1100 × AC00 ÷ 1100 × AC01 ÷",
+    "÷ AC00 × 1161 × 11A8 ÷",
+    "÷ AC00 × 11A8 × 11A8 ÷",
+    "÷ AC01 × 11A8 ÷ 1161 ÷",
+    "÷ AC01 ÷ AC00 ÷",
+    "÷ 11A8 ÷ 1100 ÷",
+    "÷ 1161 ÷ 1100 ÷",
+    # Regional indicator pairs
+    "÷ 1F1E6 × 1F1E8 ÷",
+    "÷ 1F1E6 × 1F1E8 ÷ 1F1E6 × 1F1E8 ÷ 1F1E6 ÷",
+    "÷ 0061 ÷ 1F1E6 × 1F1E8 ÷ 1F1E6 ÷ 0062 ÷",
+    "÷ 1F1E6 × 1F1E7 × 200D ÷ 1F1E8 ÷",
+    "÷ 1F1E6 × 0308 ÷ 1F1E7 ÷",
+    # ZWJ sequences and emoji modifiers
+    "÷ 1F468 × 200D × 1F469 × 200D × 1F467 ÷",
+    "÷ 1F44B × 1F3FB × 200D × 1F44B ÷",
+    "÷ 1F6D1 × 200D × 1F6D1 ÷",
+    "÷ 2701 × 200D × 2701 ÷",
+    "÷ 0061 × 200D ÷ 1F6D1 ÷",
+    "÷ 1F476 × 1F3FF ÷ 1F476 ÷",
+    "÷ 1F6D1 × 0308 × 200D × 1F6D1 ÷",
+    "÷ 1F6D1 × 200D ÷ 0020 × 200D ÷ 1F6D1 ÷",
+    # Tag sequences, above the table
+    "÷ 1F3F4 × E0067 × E0062 × E0065 × E006E × E0067 × E007F ÷",
+]
+
+
+def parse(case):
+    clusters = []
+    for part in case.strip("÷ ").split(" ÷ "):
+        clusters.append("".join(chr(int(cp, 16)) for cp in part.split(" × ")))
+
+    return clusters
+
+
+@pytest.mark.parametrize("case", GRAPHEME_BREAKS)
+def test_grapheme_breaks(case):
+    clusters = parse(case)
+    assert split("".join(clusters)) == clusters
+
+
+def test_grapheme_break_conformance():
+    with open(BREAK_TEST, encoding="utf-8") as f:
+        header = f.readline()
+        cases = [line.split("#")[0].strip() for line in f]
+
+    assert header.startswith(f"# GraphemeBreakTest-{graphemetables.UNIDATA_VERSION}.txt")
+    for case in filter(None, cases):
+        clusters = parse(case)
+        assert split("".join(clusters)) == clusters, case
+
+
+def test_rules_table():
+    rules = utf8utils._RULES
+    n = utf8utils.NCLASSES
+    assert len(rules) == n * n
+    assert rules[utf8utils.CR * n + utf8utils.LF] == utf8utils.KEEP
+    assert rules[utf8utils.LF * n + utf8utils.EXTEND] == utf8utils.BREAK
+    assert rules[utf8utils.ZWJ * n + utf8utils.PICTOGRAPHIC] == utf8utils.EMOJI
+    assert rules[utf8utils.REGIONAL * n + utf8utils.REGIONAL] == utf8utils.FLAG
+    assert rules[utf8utils.PREPEND * n + utf8utils.CONTROL] == utf8utils.BREAK
+
+
+def test_split_ascii():
+    assert split("ab c") == ["a", "b", " ", "c"]
+    assert split("a\r\nb") == ["a", "\r\n", "b"]
+
+
+# Clusters which don't merge with whatever comes next
+CLUSTERS = ["a", " ", "e\u0301", "\u00e8", "\u6f22", "\uac01\u11a8",
+    "\U0001f1ee\U0001f1f9", "\U0001f44b\U0001f3fb",
+    "\U0001f468\u200d\U0001f469\u200d\U0001f467", "\u0600x", "\n"]
+
+
+def test_spans_cut_on_grapheme_boundaries():
+    rnd = random.Random(1459)
+    for _ in range(200):
+        clusters = [rnd.choice(CLUSTERS) for _ in range(rnd.randrange(1, 60))]
+        text = "".join(clusters)
+        bounds = {0}
+        for cluster in clusters:
+            bounds.add(max(bounds) + len(cluster.encode()))
+
+        chunker = UTF8Chunker(text)
+        data = chunker.data
+        # Longest cluster is 18 bytes
+        chunksize = rnd.randrange(18, 64)
+        covered = bytearray()
+        for offset, length in chunker.spans(chunksize):
+            assert 0 < length <= chunksize
+            assert offset in bounds and offset + length in bounds
+            chunk = data[offset:offset + length]
+            assert b"\n" not in chunk
+            chunk.decode()
+            covered += chunk
+
+        assert bytes(covered) == data.replace(b"\n", b"")
+
+
+def test_spans_keep_codepoints_of_overlong_clusters():
+    family = "\U0001f468\u200d\U0001f469\u200d\U0001f467"
+    chunker = UTF8Chunker(family * 2)
+    spans = list(chunker.spans(10))
+    assert sum(length for _, length in spans) == len(chunker.data)
+    for offset, length in spans:
+        assert length <= 10
+        chunker.data[offset:offset + length].decode()
+
+
+def test_spans_chunksize_can_shrink():
+    chunker = UTF8Chunker("abcdefghij")
+    spans = []
+    for span in chunker.spans(4):
+        spans.append(span)
+        chunker.chunksize = 2
+
+    assert spans == [(0, 4), (4, 2), (6, 2), (8, 2)]
+
@@ -0,0 +1,173 @@
+import trio
+import trio.testing
+
+from ..core.bookkeeping.whosync import WhoSync, WHO_TIMEOUT
+from ..core.bookkeeping.numerics import isupport_prefix
+from ..core.irclib import parser
+from ..core.mixins import Network
+
+
+def run(f, *args):
+    return trio.run(f, *args, clock=trio.testing.MockClock(autojump_threshold=0))
+
+
+class FakeDriver:
+    def __init__(self, server=None):
+        # server(msg) -> lines it answers with, fed straight to the WhoSync
+        self.server = server or (lambda msg: [])
+        self.sync = None
+        self.sent = []
+        self.busy_until = 0
+
+    def idle(self, lines=1):
+        return trio.current_time() >= self.busy_until
+
+    async def send(self, msg):
+        self.sent.append((trio.current_time(), msg.command, msg.args))
+        for line in self.server(msg):
+            self.sync.manage(parser.parse(line))
+
+
+def setup(driver, whox=False, **kwargs):
+    network = Network({"network": "Test", "nick": "mjollnir", "altnick": "mjollnir_"},
+        driver)
+    network.identified = True
+    if whox:
+        network.capabilities["WHOX"] = ""
+
+    isupport_prefix(network, "(ov)@+", False)
+    for channel in ("#chan", "#other"):
+        network.add_channel(channel)
+        network.add_member(channel, "bob")
+
+    driver.sync = WhoSync(network, **kwargs)
+    return network, driver.sync
+
+
+async def sync_until(sync, driver, count):
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(sync.run)
+        while len(driver.sent) < count:
+            await trio.sleep(0.1)
+
+        # Let the last query finish
+        await trio.sleep(1)
+        nursery.cancel_scope.cancel()
+
+
+def test_whox():
+    def server(msg):
+        channel = msg.args[0]
+        return [
+            f":irc 354 mjollnir 174 {channel} ~bob bob.example Bob H@",
+            # Not a member, e.g. parted before the reply
+            f":irc 354 mjollnir 174 {channel} ~carol carol.example carol G",
+            f":irc 354 mjollnir 999 {channel} ~bob evil.example bob H",
+            f":irc 315 mjollnir {channel} :End of WHO",
+        ]
+
+    async def main():
+        driver = FakeDriver(server)
+        network, sync = setup(driver, whox=True)
+        sync.schedule("#chan")
+        await sync_until(sync, driver, 1)
+        return network, driver
+
+    network, driver = run(main)
+    assert [sent[1:] for sent in driver.sent] == [("WHO", ["#chan", "%tcuhnf,174"])]
+    bob = network.users["bob"]
+    assert (bob.ident, bob.hostname) == ("~bob", "bob.example")
+    assert network.channels["#chan"].grade("bob") == network.prefix_map["@"]
+    assert network.channels["#other"].grade("bob") == 0
+    assert "carol" not in network.users
+    assert "carol" not in network.channels["#chan"]
+
+
+def test_plain_who():
+    def server(msg):
+        return [
+            ":irc 352 mjollnir #chan ~bob bob.example irc.example bob H+ :0 Bob",
+            ":irc 352 mjollnir #chan ~carol carol.example irc.example carol H :0 Carol",
+            ":irc 315 mjollnir #chan :End of WHO",
+        ]
+
+    async def main():
+        driver = FakeDriver(server)
+        network, sync = setup(driver)
+        sync.schedule("#chan")
+        await sync_until(sync, driver, 1)
+        return network, driver
+
+    network, driver = run(main)
+    assert [sent[1:] for sent in driver.sent] == [("WHO", ["#chan"])]
+    assert network.users["bob"].hostname == "bob.example"
+    assert network.channels["#chan"].grade("bob") == network.prefix_map["+"]
+    assert "carol" not in network.users
+
+
+def test_who_prefix_adds_to_tracked_modes():
+    def server(msg):
+        return [
+            ":irc 352 mjollnir #chan ~bob bob.example irc.example bob H@ :0 Bob",
+            ":irc 352 mjollnir #other ~bob bob.example irc.example bob H :0 Bob",
+            ":irc 315 mjollnir #chan :End of WHO",
+        ]
+
+    async def main():
+        driver = FakeDriver(server)
+        network, sync = setup(driver)
+        voice = network.prefix_map["+"]
+        # +v from MODE, the reply only shows the highest prefix
+        network.channels["#chan"].set_grade("bob", voice)
+        network.channels["#other"].set_grade("bob", voice)
+        sync.schedule("#chan")
+        await sync_until(sync, driver, 1)
+        return network
+
+    network = run(main)
+    prefix_map = network.prefix_map
+    assert network.channels["#chan"].grade("bob") == prefix_map["@"] | prefix_map["+"]
+    assert network.channels["#other"].grade("bob") == prefix_map["+"]
+
+
+def test_queries_are_spaced_and_wait_for_idle():
+    async def main():
+        driver = FakeDriver(lambda msg: [f":irc 315 mjollnir {msg.args[0]} :End"])
+        driver.busy_until = 12
+        network, sync = setup(driver, interval=5)
+        sync.schedule("#chan")
+        sync.schedule("#CHAN")
+        sync.schedule("#gone")
+        sync.schedule("#other")
+        await sync_until(sync, driver, 2)
+        return driver
+
+    driver = run(main)
+    # Duplicates are merged, channels we're not in are skipped
+    assert [(sent[0], sent[2][0]) for sent in driver.sent] == [(12, "#chan"), (17, "#other")]
+
+
+def test_missing_end_of_who():
+    async def main():
+        driver = FakeDriver()
+        network, sync = setup(driver, interval=5)
+        sync.schedule("#chan")
+        sync.schedule("#other")
+        await sync_until(sync, driver, 2)
+        return driver
+
+    driver = run(main)
+    assert [sent[0] for sent in driver.sent] == [0, WHO_TIMEOUT + 5]
+
+
+def test_refresh_finds_unknown_hostmasks():
+    async def main():
+        driver = FakeDriver(lambda msg: [f":irc 315 mjollnir {msg.args[0]} :End"])
+        network, sync = setup(driver, interval=5, refresh=600)
+        network.users["bob"].set_hostmask("~bob", "bob.example")
+        network.add_member("#other", "dave")
+        await sync_until(sync, driver, 1)
+        return driver
+
+    driver = run(main)
+    assert [(sent[0], sent[2][0]) for sent in driver.sent] == [(600, "#other")]
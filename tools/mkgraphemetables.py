@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Generate core/utils/graphemetables.py from the Unicode data files.
+
+    python tools/mkgraphemetables.py GraphemeBreakProperty.txt emoji-data.txt
+
+Both files are in https://www.unicode.org/Public/<version>/ucd/, the first
+one under auxiliary/ and the second one under emoji/ (since Unicode 13.0).
+GraphemeBreakTest.txt from auxiliary/ goes in tests/data/ along with them.
+"""
+import os
+import re
+import sys
+
+OUTPUT = os.path.join(os.path.dirname(__file__), "..", "core", "utils",
+    "graphemetables.py")
+
+LINE = re.compile(r"^([0-9A-F]{4,6})(?:\.\.([0-9A-F]{4,6}))?\s*;\s*(\w+)")
+VERSION = re.compile(r"^# GraphemeBreakProperty-(\d+\.\d+\.\d+)\.txt")
+
+
+def parse(path, wanted=None):
+    # {property value: [(first, last), ...]}, the version from the header
+    props = {}
+    version = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            m = VERSION.match(line)
+            if m:
+                version = m.group(1)
+                continue
+
+            m = LINE.match(line)
+            if m is None:
+                continue
+
+            first, last, value = m.groups()
+            if wanted is not None and value != wanted:
+                continue
+
+            first = int(first, 16)
+            last = int(last, 16) if last else first
+            props.setdefault(value, []).append((first, last))
+
+    return props, version
+
+
+def merge(ranges):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and merged[-1][1] + 1 == first:
+            merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+
+    return merged
+
+
+def format_ranges(name, ranges):
+    lines = [f"{name} = ("]
+    line = "   "
+    for first, last in ranges:
+        item = f" (0x{first:04X}, 0x{last:04X}),"
+        if len(line) + len(item) > 79:
+            lines.append(line)
+            line = "   "
+
+        line += item
+
+    lines.append(line)
+    lines.append(")")
+    return "\n".join(lines)
+
+
+def main(argv):
+    if len(argv) != 3:
+        sys.exit(__doc__)
+
+    breaks, version = parse(argv[1])
+    if version is None:
+        sys.exit(f"{argv[1]}: no version in the header")
+
+    emoji, _ = parse(argv[2], "Extended_Pictographic")
+
+    out = [
+        "# -*- coding: utf-8 -*-",
+        "# Generated by tools/mkgraphemetables.py from GraphemeBreakProperty.txt",
+        "# and emoji-data.txt, don't edit by hand.",
+        "",
+        f'UNIDATA_VERSION = "{version}"',
+        "",
+        "# Grapheme_Cluster_Break values, codepoints not listed are Other",
+    ]
+    names = []
+    for value in sorted(breaks):
+        name = re.sub(r"(?<=[a-z])(?=[A-Z])", "_", value).upper()
+        names.append((value, name))
+        out.append(format_ranges(name, merge(breaks[value])))
+
+    out.append("")
+    out.append(format_ranges("EXTENDED_PICTOGRAPHIC",
+        merge(emoji["Extended_Pictographic"])))
+    out.append("")
+    out.append("GRAPHEME_BREAK = {")
+    for value, name in names:
+        out.append(f'    "{value}": {name},')
+
+    out.append("}")
+
+    with open(OUTPUT, "w", encoding="utf-8") as f:
+        f.write("\n".join(out) + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv)